@@ -1,8 +1,62 @@
 # stores all information regarding current chess game state
 # helps determine valid chess moves from current state, and keeps a move log
 
+import random
+import evaluation
+
+#Zobrist hashing: a random 64 bit number for every piece on every square, every set of castle rights,
+#every en passant file and for black to move. xor-ing together the numbers for what is on the board
+#gives a key that identifies the position and can be updated with a few xors per move
+ZOBRIST_DEBUG = False #when True, every makeMove/undoMove checks the key against a full recompute
+zobristRandom = random.Random(20240101) #fixed seed so keys are the same in every process
+ZOBRIST_PIECES = {piece: [zobristRandom.getrandbits(64) for _ in range(64)]
+                  for piece in ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")}
+zobristCastleRights = [zobristRandom.getrandbits(64) for _ in range(4)] #wks, bks, wqs, bqs
+#one key per combination of castle rights (index bits: wks = 1, bks = 2, wqs = 4, bqs = 8)
+ZOBRIST_CASTLE = [0] * 16
+for rights in range(16):
+    for bit in range(4):
+        if rights & (1 << bit):
+            ZOBRIST_CASTLE[rights] ^= zobristCastleRights[bit]
+ZOBRIST_EN_PASSANT = [zobristRandom.getrandbits(64) for _ in range(8)] #one per file
+ZOBRIST_BLACK_MOVE = zobristRandom.getrandbits(64)
+
+FIFTY_MOVE_PLIES = 100 #halfmove clock at which the game is drawn by the fifty-move rule
+
+#move tables built once at import, indexed by row * 8 + col. Every entry is a (row, col, row * 8 + col) square
+#already clipped to the board: the squares a knight or king reaches from a square, and the squares along
+#each direction moving outwards (first 4 directions straight, last 4 diagonal)
+KNIGHT_JUMPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+RAY_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+#a piece pinned along a direction's line may move either way along it
+LINE_DIRECTIONS = tuple(((dRow, dCol), (-dRow, -dCol)) for dRow, dCol in RAY_DIRECTIONS)
+SLIDER_DIRECTIONS = {'R': range(0, 4), 'B': range(4, 8), 'Q': range(0, 8)} #ray directions of each sliding piece
+
+def squaresFrom(row, col, steps):
+    return tuple((row + dRow, col + dCol, (row + dRow) * 8 + col + dCol) for dRow, dCol in steps
+                 if 0 <= row + dRow < 8 and 0 <= col + dCol < 8)
+
+KNIGHT_SQUARES = [squaresFrom(row, col, KNIGHT_JUMPS) for row in range(8) for col in range(8)]
+KING_SQUARES = [squaresFrom(row, col, KING_STEPS) for row in range(8) for col in range(8)]
+RAY_SQUARES = [tuple(squaresFrom(row, col, [(dRow * i, dCol * i) for i in range(1, 8)]) for dRow, dCol in RAY_DIRECTIONS)
+               for row in range(8) for col in range(8)]
+
 class GameState():
-    def __init__(self):
+    '''
+    GameState(backend = "bitboard") builds the bitboard backed version from bitboard.py,
+    which keeps the same makeMove/undoMove/validMoves API
+    '''
+    def __new__(cls, backend = "mailbox"):
+        if cls is GameState and backend != "mailbox":
+            if backend != "bitboard":
+                raise ValueError("unknown GameState backend: " + str(backend))
+            import bitboard
+            cls = bitboard.BitboardGameState
+        return super().__new__(cls)
+
+    def __init__(self, backend = "mailbox"):
+        self.backend = "mailbox" #how the board is stored and moves are generated
         #creates an 8x8 2D list where each element is a either a piece or blank space
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR" ] ,
@@ -31,14 +85,150 @@ class GameState():
         self.currentCastle = CastleRights(True, True, True, True)
         self.castleLog = [CastleRights(self.currentCastle.wks, self.currentCastle.bks, 
                                        self.currentCastle.wqs, self.currentCastle.bqs)]
+        #zobrist key of the current position and the keys of the positions before each logged move
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = []
+        #material + position score (see evaluation.PIECE_SQUARE_SCORES) and the scores before each logged move
+        self.score = self.computeScore()
+        self.scoreLog = []
+        self.pieceCount = 32 #pieces on the board, kings included
+        #move counters as in FEN: plies since the last capture or pawn move, and the number of the full move
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = []
+        self.fullmoveNumber = 1
          
+    '''
+    Build a GameState from a FEN string, ex: GameState.fromFEN("8/8/4k3/8/8/4K3/4P3/8 w - - 0 1", "bitboard")
+    '''
+    @classmethod
+    def fromFEN(cls, fen, backend = "mailbox"):
+        gs = cls(backend)
+        gs.loadFEN(fen)
+        return gs
+
+    '''
+    Set up the position of a FEN string: board, side to move, castle rights, en passant square and the move
+    counters (optional, 0 and 1 if left out). Raises ValueError if the string isn't a valid FEN
+    '''
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6:
+            raise ValueError("FEN needs 4 to 6 fields: " + fen)
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("FEN board needs 8 rows: " + fen)
+        board = []
+        kings = {}
+        for row, rank in enumerate(rows):
+            squares = []
+            for char in rank:
+                if char.isdigit(): #run of empty squares
+                    squares.extend(["--"] * int(char))
+                elif char.upper() in "PNBRQK":
+                    piece = ('w' if char.isupper() else 'b') + (char.upper() if char.upper() != 'P' else 'p')
+                    if piece[1] == 'K':
+                        if piece in kings:
+                            raise ValueError("FEN has two " + piece + ": " + fen)
+                        kings[piece] = (row, len(squares))
+                    squares.append(piece)
+                else:
+                    raise ValueError("bad FEN piece '" + char + "': " + fen)
+            if len(squares) != 8:
+                raise ValueError("FEN row " + str(row + 1) + " isn't 8 squares: " + fen)
+            board.append(squares)
+        if len(kings) != 2:
+            raise ValueError("FEN needs one king of each color: " + fen)
+        if fields[1] not in ("w", "b") or (fields[2] != "-" and not set(fields[2]) <= set("KQkq")):
+            raise ValueError("bad FEN side to move or castle rights: " + fen)
+        enPassant = ()
+        if fields[3] != "-":
+            #behind a pawn of the side that just moved, which came from the square behind it
+            if len(fields[3]) != 2 or fields[3][0] not in Move.filesToCols or fields[3][1] != ("6" if fields[1] == "w" else "3"):
+                raise ValueError("bad FEN en passant square: " + fen)
+            row, col = Move.ranksToRows[fields[3][1]], Move.filesToCols[fields[3][0]]
+            forward = 1 if fields[1] == "w" else -1 #from the en passant square towards the pushed pawn
+            if board[row + forward][col] != ("b" if fields[1] == "w" else "w") + "p" or \
+                    board[row][col] != "--" or board[row - forward][col] != "--":
+                raise ValueError("FEN en passant square without a pawn that just moved two squares: " + fen)
+            enPassant = (row, col)
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("bad FEN move counters: " + fen)
+
+        self.board = board
+        self.whiteKing = kings["wK"]
+        self.blackKing = kings["bK"]
+        self.whiteMove = fields[1] == "w"
+        #a castle right needs the king and the rook on their home squares, rights without them are dropped
+        castle = [right for right, row, rookCol in (('K', 7, 7), ('Q', 7, 0), ('k', 0, 7), ('q', 0, 0))
+                  if fields[2] != "-" and right in fields[2] and board[row][4] == ('w' if right.isupper() else 'b') + 'K'
+                  and board[row][rookCol] == ('w' if right.isupper() else 'b') + 'R']
+        self.currentCastle = CastleRights('K' in castle, 'k' in castle, 'Q' in castle, 'q' in castle)
+        self.castleLog = [CastleRights('K' in castle, 'k' in castle, 'Q' in castle, 'q' in castle)]
+        self.enPassantPossible = enPassant
+        self.enPassantPossibleLog = [enPassant]
+        self.halfmoveClock = halfmoveClock
+        self.fullmoveNumber = fullmoveNumber
+        #the new position has no history
+        self.moveLog = []
+        self.halfmoveClockLog = []
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = []
+        self.score = self.computeScore()
+        self.scoreLog = []
+        self.pieceCount = sum(1 for row in self.board for piece in row if piece != "--")
+        self.checkMate = self.staleMate = self.inCheck = False
+
+    '''
+    FEN string of the current position
+    '''
+    def toFEN(self):
+        rows = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            rows.append(rank + (str(empty) if empty else ""))
+        castle = ("K" if self.currentCastle.wks else "") + ("Q" if self.currentCastle.wqs else "") + \
+                 ("k" if self.currentCastle.bks else "") + ("q" if self.currentCastle.bqs else "")
+        enPassant = "-"
+        if self.enPassantPossible != ():
+            enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]]
+        return " ".join(("/".join(rows), "w" if self.whiteMove else "b", castle or "-", enPassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)))
+
     '''
     Takes move as a parameter and executes it
     '''
     def makeMove(self, move):
+        self.zobristLog.append(self.zobristKey)
+        key = self.zobristKey ^ ZOBRIST_BLACK_MOVE ^ ZOBRIST_CASTLE[self.currentCastle.index()] #swap side, take out old rights
+        key ^= ZOBRIST_PIECES[move.pieceMoved][move.startRow * 8 + move.startCol]
+        scores = evaluation.PIECE_SQUARE_SCORES
+        self.scoreLog.append(self.score)
+        score = self.score - scores[move.pieceMoved][move.startRow * 8 + move.startCol]
+        if move.pieceCaptured != "--":
+            capturedRow = move.startRow if move.enPassant else move.endRow
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][capturedRow * 8 + move.endCol]
+            score -= scores[move.pieceCaptured][capturedRow * 8 + move.endCol]
+            self.pieceCount -= 1
+        key ^= self.enPassantKey()
         self.board[move.startRow][move.startCol] = "--" #make start square empty
         self.board[move.endRow][move.endCol] = move.pieceMoved #move piece to end square
         self.moveLog.append(move) #log the move
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        self.halfmoveClock = 0 if move.pieceMoved[1] == 'p' or move.isCapture else self.halfmoveClock + 1
+        if move.pieceMoved[0] == 'b': #a full move ends with black's move
+            self.fullmoveNumber += 1
         self.whiteMove = not self.whiteMove #swap players turn
         if move.pieceMoved == "wK":
             self.whiteKing = (move.endRow, move.endCol) 
@@ -54,7 +244,7 @@ class GameState():
             self.board[move.startRow][move.endCol] = "--"
         #if pawn promotion, change piece
         if move.pawnPromotion: 
-          self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+          self.board[move.endRow][move.endCol] = move.pieceMoved[0] + move.promotionPiece
     
         #castle moves
         if move.castle:
@@ -75,6 +265,25 @@ class GameState():
         self.updateCastleRights(move)
         self.castleLog.append(CastleRights(self.currentCastle.wks, self.currentCastle.bks, 
                                            self.currentCastle.wqs, self.currentCastle.bqs))
+
+        #add the piece on its end square (promoted piece included), moved rook, new en passant file and rights
+        endPiece = self.board[move.endRow][move.endCol]
+        key ^= ZOBRIST_PIECES[endPiece][move.endRow * 8 + move.endCol]
+        score += scores[endPiece][move.endRow * 8 + move.endCol]
+        if move.castle:
+            rook = move.pieceMoved[0] + 'R'
+            rookKeys = ZOBRIST_PIECES[rook]
+            if move.endCol == 6: #kingside, rook from column 7 to 5
+                key ^= rookKeys[move.endRow * 8 + 7] ^ rookKeys[move.endRow * 8 + 5]
+                score += scores[rook][move.endRow * 8 + 5] - scores[rook][move.endRow * 8 + 7]
+            else: #queenside, rook from column 0 to 3
+                key ^= rookKeys[move.endRow * 8] ^ rookKeys[move.endRow * 8 + 3]
+                score += scores[rook][move.endRow * 8 + 3] - scores[rook][move.endRow * 8]
+        self.score = score
+        key ^= self.enPassantKey()
+        self.zobristKey = key ^ ZOBRIST_CASTLE[self.currentCastle.index()]
+        if ZOBRIST_DEBUG:
+            self.checkZobristKey()
                 
     '''
     Undos the last move made
@@ -99,7 +308,8 @@ class GameState():
                 
             #restore ability to castle
             self.castleLog.pop()
-            self.currentCastle = self.castleLog[-1] #set current castle rights to last in list
+            lastCastle = self.castleLog[-1] #set current castle rights to a copy of the last in list
+            self.currentCastle = CastleRights(lastCastle.wks, lastCastle.bks, lastCastle.wqs, lastCastle.bqs)
             
             #undo castle move
             if move.castle:
@@ -110,10 +320,45 @@ class GameState():
                     self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1] #move rook
                     self.board[move.endRow][move.endCol + 1] = '--' #empty space where rook was
             
+            self.zobristKey = self.zobristLog.pop() #restore key of the previous position
+            self.score = self.scoreLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog.pop()
+            if move.pieceCaptured != "--":
+                self.pieceCount += 1
+            if move.pieceMoved[0] == 'b':
+                self.fullmoveNumber -= 1
+            if ZOBRIST_DEBUG:
+                self.checkZobristKey()
+
             #any time move is undone, we can not be in these states
             self.checkMate = False
             self.staleMate = False
                     
+    '''
+    Pass: the other side moves next and the en passant chance is gone, the pieces stay. Used by null move
+    pruning, undone with undoNullMove. Positions before a pass don't count for repetitions
+    '''
+    def makeNullMove(self):
+        self.zobristLog.append(self.zobristKey)
+        self.zobristKey = self.zobristKey ^ ZOBRIST_BLACK_MOVE ^ self.enPassantKey()
+        self.enPassantPossible = ()
+        self.enPassantPossibleLog.append(self.enPassantPossible) #undoMove restores en passant from this log
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        self.halfmoveClock = 0
+        self.whiteMove = not self.whiteMove
+
+    '''
+    Take back the pass made by makeNullMove
+    '''
+    def undoNullMove(self):
+        self.whiteMove = not self.whiteMove
+        self.halfmoveClock = self.halfmoveClockLog.pop()
+        self.enPassantPossibleLog.pop()
+        self.enPassantPossible = self.enPassantPossibleLog[-1]
+        self.zobristKey = self.zobristLog.pop()
+        self.checkMate = False
+        self.staleMate = False
+
     '''
     All moves considering checks
     '''
@@ -150,7 +395,9 @@ class GameState():
                 for i in range(len(moves) - 1, -1, -1): #go backwards through list
                     if moves[i].pieceMoved[1] != 'K': #doesn't move king
                         if not (moves[i].endRow, moves[i].endCol) in validSquares: #doesn't check or capture piece
-                            moves.remove(moves[i]) #remove move
+                            #en passant ends the check if the captured pawn is the checking piece
+                            if not (moves[i].enPassant and (moves[i].startRow, moves[i].endCol) == (checkRow, checkCol)):
+                                moves.remove(moves[i]) #remove move
             else: #double check, king must move
                 self.getKingMoves(kingRow,kingCol,moves)
         else: #not in check
@@ -184,7 +431,107 @@ class GameState():
                     piece = self.board[row][col][1]
                     self.moveFunctions[piece](row,col,moves) #calls move function based on piece type
         return moves
-    
+
+    '''
+    Legal captures and promotions only, without building the full move list (used by quiescence search)
+    When in check every legal move is returned instead, all check evasions have to be looked at
+    '''
+    def captureMoves(self):
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return self.validMoves()
+        #without every move we can't tell stalemate, and with the king safe it isn't checkmate
+        self.checkMate = False
+        self.staleMate = False
+        moves = []
+        board = self.board
+        pins = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in self.pins}
+        if self.whiteMove:
+            friendlyColor, opponentColor, moveAmount, backRow = 'w', 'b', -1, 0
+        else:
+            friendlyColor, opponentColor, moveAmount, backRow = 'b', 'w', 1, 7
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != friendlyColor:
+                    continue
+                pinDirection = pins.get((row, col)) #None if the piece isn't pinned
+                if piece[1] == 'p':
+                    endRow = row + moveAmount
+                    #promotion by pushing to the back rank
+                    if endRow == backRow and board[endRow][col] == "--" and (pinDirection is None or pinDirection[1] == 0):
+                        self.addPawnMoves((row, col), (endRow, col), moves, True)
+                    for dCol in (-1, 1):
+                        endCol = col + dCol
+                        if not 0 <= endCol < 8:
+                            continue
+                        if pinDirection is not None and pinDirection not in ((moveAmount, dCol), (-moveAmount, -dCol)):
+                            continue #capture would leave the pin
+                        if board[endRow][endCol][0] == opponentColor:
+                            self.addPawnMoves((row, col), (endRow, endCol), moves, endRow == backRow)
+                        elif (endRow, endCol) == self.enPassantPossible:
+                            move = packedMove(row * 8 + col | (endRow * 8 + endCol) << 6 | PACKED_EN_PASSANT, board)
+                            if self.leavesKingSafe(move): #both pawns leave the row, check for discovered attacks
+                                moves.append(move)
+                elif piece[1] == 'N':
+                    if pinDirection is None: #pinned knights can't move
+                        for endRow, endCol, endSq in KNIGHT_SQUARES[row * 8 + col]:
+                            if board[endRow][endCol][0] == opponentColor:
+                                moves.append(packedMove(row * 8 + col | endSq << 6, board))
+                elif piece[1] == 'K':
+                    board[row][col] = "--" #lift the king so it doesn't shield the squares behind it
+                    safeSquares = [endSq for endRow, endCol, endSq in KING_SQUARES[row * 8 + col]
+                                   if board[endRow][endCol][0] == opponentColor
+                                   and not self.isSquareAttacked((endRow, endCol), opponentColor)]
+                    board[row][col] = piece
+                    for endSq in safeSquares:
+                        moves.append(packedMove(row * 8 + col | endSq << 6, board))
+                else: #sliding pieces
+                    rays = RAY_SQUARES[row * 8 + col]
+                    for d in SLIDER_DIRECTIONS[piece[1]]:
+                        if pinDirection is not None and pinDirection not in LINE_DIRECTIONS[d]:
+                            continue #can only move along the pin
+                        for endRow, endCol, endSq in rays[d]:
+                            endPiece = board[endRow][endCol]
+                            if endPiece != "--":
+                                if endPiece[0] == opponentColor:
+                                    moves.append(packedMove(row * 8 + col | endSq << 6, board))
+                                break #first piece in this direction
+        return moves
+
+    '''
+    The legal move with this moveID in the current position, or None. Only the moves of the piece on the start
+    square are generated, so a stored hash or killer move can be tried before generating every move
+    '''
+    def moveFromID(self, moveID):
+        row, col = (moveID & 63) // 8, (moveID & 63) % 8
+        piece = self.board[row][col]
+        if piece[0] != ('w' if self.whiteMove else 'b'):
+            return None
+        moves = []
+        pins = self.pins
+        self.pins = [] #pseudo legal moves, leavesKingSafe decides below
+        if piece[1] == 'K' and abs((moveID >> 6 & 63) % 8 - col) == 2:
+            self.getCastleMoves(row, col, moves)
+        else:
+            self.moveFunctions[piece[1]](row, col, moves)
+        self.pins = pins
+        for move in moves:
+            if move.moveID == moveID:
+                return move if self.leavesKingSafe(move) else None
+        return None
+
+    '''
+    Check if making the move leaves the moving side's king out of check
+    '''
+    def leavesKingSafe(self, move):
+        self.makeMove(move)
+        self.whiteMove = not self.whiteMove #look at the king of the side that moved
+        inCheck = self.checkForPinsAndChecks()[0]
+        self.whiteMove = not self.whiteMove
+        self.undoMove()
+        return not inCheck
+
     '''
     Get all pawn moves and add them to all possible moves
     '''
@@ -213,18 +560,18 @@ class GameState():
         pawnPromotion = False
             
         if self.board[row+moveAmount][col] == "--": #one square pawn advance
-            if not piecePinned or pinDirection == (moveAmount,0):
+            if not piecePinned or pinDirection in ((moveAmount,0), (-moveAmount,0)): #pinned pawns can still move along the pin
                 if row + moveAmount == backRow: #if piece gets to back rank (pawn promotion)
                     pawnPromotion = True
-                moves.append(Move((row,col), (row + moveAmount, col), self.board, pawnPromotion = pawnPromotion))
+                self.addPawnMoves((row,col), (row + moveAmount, col), moves, pawnPromotion)
                 if row == startRow and self.board[row + 2 * moveAmount][col] == "--": #two square pawn advance
-                    moves.append(Move((row,col), (row + 2 * moveAmount, col), self.board))
+                    moves.append(packedMove(row * 8 + col | ((row + 2 * moveAmount) * 8 + col) << 6, self.board))
         if col-1 >= 0: #captures to left
-            if not piecePinned or pinDirection == (moveAmount,-1):
+            if not piecePinned or pinDirection in ((moveAmount,-1), (-moveAmount,1)):
                 if self.board[row + moveAmount][col - 1][0] == opponentColor:
                     if row + moveAmount == backRow: #if piece gets to back rank (pawn promotion)
                         pawnPromotion = True
-                    moves.append(Move((row,col), (row + moveAmount,col-1), self.board, pawnPromotion = pawnPromotion))
+                    self.addPawnMoves((row,col), (row + moveAmount,col-1), moves, pawnPromotion)
                 if (row + moveAmount, col - 1) == self.enPassantPossible:
                     isAttacking = isBlocking = False #check if there is an attacking or blocking piece
                     if kingRow == row:
@@ -237,20 +584,22 @@ class GameState():
                         for i in inside:
                             if self.board[row][i] != "--": #piece blocking
                                 isBlocking = True
-                        for i in outside:
+                        for i in outside: #only the first piece past the pawns matters
                             square = self.board[row][i]
                             if square[0] == opponentColor and (square[1] == "R" or square[1] == "Q"): #attacking piece
                                 isAttacking = True
+                                break
                             elif square != "--":
                                 isBlocking = True
+                                break
                     if not isAttacking or isBlocking:
-                        moves.append(Move((row,col), (row + moveAmount, col - 1), self.board, enPassant = True))
+                        moves.append(packedMove(row * 8 + col | ((row + moveAmount) * 8 + col - 1) << 6 | PACKED_EN_PASSANT, self.board))
         if col+1 < 8: #captures to right
-            if not piecePinned or pinDirection == (moveAmount,1):
+            if not piecePinned or pinDirection in ((moveAmount,1), (-moveAmount,-1)):
                 if self.board[row + moveAmount][col + 1][0] == opponentColor:
                     if row + moveAmount == backRow: #if piece gets to back rank (pawn promotion)
                         pawnPromotion = True
-                    moves.append(Move((row,col), (row + moveAmount,col+1), self.board, pawnPromotion = pawnPromotion))
+                    self.addPawnMoves((row,col), (row + moveAmount,col+1), moves, pawnPromotion)
                 if (row + moveAmount, col + 1) == self.enPassantPossible:
                     isAttacking = isBlocking = False #check if there is an attacking or blocking piece
                     if kingRow == row:
@@ -263,15 +612,28 @@ class GameState():
                         for i in inside:
                             if self.board[row][i] != "--": #piece blocking
                                 isBlocking = True
-                        for i in outside:
+                        for i in outside: #only the first piece past the pawns matters
                             square = self.board[row][i]
                             if square[0] == opponentColor and (square[1] == "R" or square[1] == "Q"): #attacking piece
                                 isAttacking = True
+                                break
                             elif square != "--":
                                 isBlocking = True
+                                break
                     if not isAttacking or isBlocking:
-                        moves.append(Move((row,col), (row + moveAmount, col + 1), self.board, enPassant = True))
+                        moves.append(packedMove(row * 8 + col | ((row + moveAmount) * 8 + col + 1) << 6 | PACKED_EN_PASSANT, self.board))
                     
+    '''
+    Add a pawn move, or one move per promotion piece when the pawn reaches the back rank
+    '''
+    def addPawnMoves(self, startSq, endSq, moves, pawnPromotion):
+        packed = startSq[0] * 8 + startSq[1] | (endSq[0] * 8 + endSq[1]) << 6
+        if pawnPromotion:
+            for index in range(len(Move.promotionPieces)):
+                moves.append(packedMove(packed | index << 12 | PACKED_PROMOTION, self.board))
+        else:
+            moves.append(packedMove(packed, self.board))
+
     '''
     Get all rook moves and add them to all possible moves
     '''
@@ -286,25 +648,29 @@ class GameState():
                     self.pins.remove(self.pins[i])
                 break
             
-        directions = ((-1,0), (0,-1), (1,0), (0,1)) #(row,col)
+        self.getSliderMoves(row, col, SLIDER_DIRECTIONS['R'], piecePinned, pinDirection, moves)
+
+    '''
+    Add the moves of a sliding piece along the given ray directions, stopping at the first piece on each ray
+    '''
+    def getSliderMoves(self, row, col, directions, piecePinned, pinDirection, moves):
+        board = self.board
+        start = row * 8 + col
+        rays = RAY_SQUARES[start]
         opponentColor = "b" if self.whiteMove else "w"
         for d in directions:
-            for i in range(1,8): #can move a max of 7 squares
-                endRow = row + d[0] * i
-                endCol = col + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #valid board move
-                    #check if pin is in the direction or opposite direction
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endMove = self.board[endRow][endCol]
-                        if endMove == "--": #empty space
-                            moves.append(Move((row,col), (endRow,endCol), self.board))
-                        elif endMove[0] == opponentColor: #enemy piece
-                            moves.append(Move((row,col), (endRow,endCol), self.board))
-                            break
-                        else:
-                            break #friendly piece
+            #check if pin is in the direction or opposite direction
+            if piecePinned and pinDirection not in LINE_DIRECTIONS[d]:
+                continue
+            for endRow, endCol, endSq in rays[d]:
+                endMove = board[endRow][endCol]
+                if endMove == "--": #empty space
+                    moves.append(packedMove(start | endSq << 6, board))
+                elif endMove[0] == opponentColor: #enemy piece
+                    moves.append(packedMove(start | endSq << 6, board))
+                    break
                 else:
-                    break #off the board
+                    break #friendly piece
                 
     '''
     Get all knight moves and add them to all possible moves
@@ -316,16 +682,13 @@ class GameState():
                     piecePinned = True
                     self.pins.remove(self.pins[i])
                     break
-            directions = ((-2,-1), (-2,1), (-1,-2), (-1,2), (1,-2), (1,2), (2,-1), (2,1)) #(row,col) , stay on diagonal
+            if piecePinned:
+                return #a pinned knight can never stay on the pin line
             friendlyColor = "w" if self.whiteMove else "b"
-            for d in directions:
-                endRow = row + d[0]
-                endCol = col + d[1]
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #valid board move
-                    if not piecePinned:
-                        endMove = self.board[endRow][endCol]
-                        if endMove[0] != friendlyColor: #not a friendly piece (empty or enemy piece)
-                            moves.append(Move((row,col), (endRow,endCol), self.board))
+            start = row * 8 + col
+            for endRow, endCol, endSq in KNIGHT_SQUARES[start]:
+                if self.board[endRow][endCol][0] != friendlyColor: #not a friendly piece (empty or enemy piece)
+                    moves.append(packedMove(start | endSq << 6, self.board))
     
     '''
     Get all bishop moves and add them to all possible moves
@@ -340,58 +703,27 @@ class GameState():
                     self.pins.remove(self.pins[i])
                     break
                 
-            directions = ((-1,-1), (-1,1), (1,-1), (1,1)) #(row,col) , stay on diagonal
-            opponentColor = "b" if self.whiteMove else "w"
-            for d in directions:
-                for i in range(1,8): #can move a max of 7 squares
-                    endRow = row + d[0] * i
-                    endCol = col + d[1] * i
-                    if 0 <= endRow < 8 and 0 <= endCol < 8: #valid board move
-                        #check if pin is in the direction or opposite direction
-                        if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                            endMove = self.board[endRow][endCol]
-                            if endMove == "--": #empty space
-                                moves.append(Move((row,col), (endRow,endCol), self.board))
-                            elif endMove[0] == opponentColor: #enemy piece
-                                moves.append(Move((row,col), (endRow,endCol), self.board))
-                                break
-                            else:
-                                break #friendly piece
-                    else:
-                        break #off the board
+            self.getSliderMoves(row, col, SLIDER_DIRECTIONS['B'], piecePinned, pinDirection, moves)
     
     '''
     Get all king moves and add them to all possible moves
     '''
     def getKingMoves(self, row, col, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        friendlyColor = "w" if self.whiteMove else "b"
-        for i in range(8):
-            endRow = row + rowMoves[i]
-            endCol = col + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8: #valid board move
-                endMove = self.board[endRow][endCol]
-                if endMove[0] != friendlyColor: #not a friendly piece (empty or enemy piece)
-                    #place king on end square, check for checks
-                    if friendlyColor == 'w':
-                        self.whiteKing = (endRow, endCol)
-                    else:
-                        self.blackKing = (endRow, endCol)
-                    inCheck, pins, checks, = self.checkForPinsAndChecks()
-                    if not inCheck: #valid move
-                        moves.append(Move((row,col), (endRow,endCol), self.board))
-                    #king goes back to original location
-                    if friendlyColor == 'w':
-                        self.whiteKing = (row, col)
-                    else:
-                        self.blackKing = (row, col)
+        friendlyColor, enemyColor = ("w", "b") if self.whiteMove else ("b", "w")
+        king = self.board[row][col]
+        self.board[row][col] = "--" #lift the king so it doesn't shield the squares behind it from sliders
+        safeSquares = [endSq for endRow, endCol, endSq in KING_SQUARES[row * 8 + col]
+                       if self.board[endRow][endCol][0] != friendlyColor #empty or enemy piece
+                       and not self.isSquareAttacked((endRow, endCol), enemyColor)]
+        self.board[row][col] = king
+        for endSq in safeSquares:
+            moves.append(packedMove(row * 8 + col | endSq << 6, self.board))
         
     '''
     Generate all valid castle moves for the king at (row,col)
     '''
     def getCastleMoves(self, row, col, moves):
-        if self.squareUnderAttack(row, col):
+        if self.isSquareAttacked((row, col), "b" if self.whiteMove else "w"):
             return #can't castle
         if (self.whiteMove and self.currentCastle.wks) or (not self.whiteMove and self.currentCastle.bks):
             self.kingsideCastle(row, col, moves)
@@ -401,14 +733,16 @@ class GameState():
         
     def kingsideCastle(self, row, col, moves):
         if col + 2 < len(self.board[row]) and self.board[row][col+1] == '--' and self.board[row][col+2] == '--':
-            if not self.squareUnderAttack(row, col+1) and not self.squareUnderAttack(row, col+2):
-                moves.append(Move((row, col), (row, col+2), self.board, castle = True))
+            enemyColor = "b" if self.whiteMove else "w"
+            if not self.isSquareAttacked((row, col+1), enemyColor) and not self.isSquareAttacked((row, col+2), enemyColor):
+                moves.append(packedMove(row * 8 + col | (row * 8 + col + 2) << 6 | PACKED_CASTLE, self.board))
                 
         
     def queensideCastle(self, row, col, moves):
         if self.board[row][col-1] == '--' and self.board[row][col-2] == '--' and self.board[row][col-3] == '--':
-            if not self.squareUnderAttack(row, col-1) and not self.squareUnderAttack(row, col-2):
-                moves.append(Move((row, col), (row, col-2), self.board, castle = True))
+            enemyColor = "b" if self.whiteMove else "w"
+            if not self.isSquareAttacked((row, col-1), enemyColor) and not self.isSquareAttacked((row, col-2), enemyColor):
+                moves.append(packedMove(row * 8 + col | (row * 8 + col - 2) << 6 | PACKED_CASTLE, self.board))
         
     '''
     Get all queen moves and add them to all possible moves
@@ -434,51 +768,44 @@ class GameState():
             friendlyColor = "b"
             startRow, startCol = self.blackKing
 
-        #directions: 8 possible for Rooks/Bishops/Queens
-        directions = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
+        #look outwards from the king along the 8 rays for Rooks/Bishops/Queens
+        board = self.board
+        start = startRow * 8 + startCol
+        rays = RAY_SQUARES[start]
+        for j in range(8):
+            d = RAY_DIRECTIONS[j]
             possiblePin = ()
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endMove = self.board[endRow][endCol]
-                    if endMove[0] == friendlyColor and endMove[1] != 'K':
-                        if possiblePin == ():
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else:
-                            break  #second friendly piece, no pin or check possible in this direction
-                    elif endMove[0] == opponentColor:
-                        type = endMove[1]
-                        #checks for rook, bishop, queen
-                        if (type == 'R' and (d[0] == 0 or d[1] == 0)) or \
-                        (type == 'B' and (d[0] != 0 and d[1] != 0)) or \
-                        (type == 'Q') or \
-                        (i == 1 and type == 'K') or \
-                        (i == 1 and type == 'p' and ((opponentColor == 'w' and 6 <= j <= 7) or (opponentColor == 'b' and 4 <= j <= 5))):
-                            if possiblePin == ():  #no blocking piece, check
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else:  #piece blocking, pin
-                                pins.append(possiblePin)
-                                break
-                        else:
-                            break  #enemy piece but not checking, stop in this direction
-                else:
-                    break  #off the board
+            for i, (endRow, endCol, endSq) in enumerate(rays[j], 1):
+                endMove = board[endRow][endCol]
+                if endMove[0] == friendlyColor and endMove[1] != 'K':
+                    if possiblePin == ():
+                        possiblePin = (endRow, endCol, d[0], d[1])
+                    else:
+                        break  #second friendly piece, no pin or check possible in this direction
+                elif endMove[0] == opponentColor:
+                    type = endMove[1]
+                    #checks for rook, bishop, queen, king next to it, and pawns attacking diagonally towards the king
+                    if (type == 'R' and j < 4) or \
+                    (type == 'B' and j >= 4) or \
+                    (type == 'Q') or \
+                    (i == 1 and type == 'K') or \
+                    (i == 1 and type == 'p' and j >= 4 and d[0] == (1 if opponentColor == 'w' else -1)):
+                        if possiblePin == ():  #no blocking piece, check
+                            inCheck = True
+                            checks.append((endRow, endCol, d[0], d[1]))
+                            break
+                        else:  #piece blocking, pin
+                            pins.append(possiblePin)
+                            break
+                    else:
+                        break  #enemy piece but not checking, stop in this direction
 
         #knights possible moves
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for move in knightMoves:
-            endRow = startRow + move[0]
-            endCol = startCol + move[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endMove = self.board[endRow][endCol]
-                if endMove[0] == opponentColor and endMove[1] == 'N':
-                    inCheck = True
-                    checks.append((endRow, endCol, move[0], move[1]))
+        for endRow, endCol, endSq in KNIGHT_SQUARES[start]:
+            endMove = board[endRow][endCol]
+            if endMove[0] == opponentColor and endMove[1] == 'N':
+                inCheck = True
+                checks.append((endRow, endCol, endRow - startRow, endCol - startCol))
 
         return inCheck, pins, checks
     
@@ -489,33 +816,202 @@ class GameState():
         if move.pieceMoved == 'wK':
             self.currentCastle.wks = False
             self.currentCastle.wqs = False
-        elif move.pieceMoved == 'bk':
+        elif move.pieceMoved == 'bK':
             self.currentCastle.bks = False
             self.currentCastle.bqs = False
         elif move.pieceMoved == 'wR':
             if move.startRow == 7:
                 if move.startCol == 0:
-                    self.currentCastle.wqs == False
+                    self.currentCastle.wqs = False
                 elif move.startCol == 7:
-                    self.currentCastle.wks == False
+                    self.currentCastle.wks = False
         elif move.pieceMoved == 'bR':
             if move.startRow == 0:
                 if move.startCol == 0:
-                    self.currentCastle.bqs == False
+                    self.currentCastle.bqs = False
                 elif move.startCol == 7:
-                    self.currentCastle.bks == False
+                    self.currentCastle.bks = False
+        #a rook captured on its starting square can't castle anymore
+        if move.pieceCaptured == 'wR' and move.endRow == 7:
+            if move.endCol == 0:
+                self.currentCastle.wqs = False
+            elif move.endCol == 7:
+                self.currentCastle.wks = False
+        elif move.pieceCaptured == 'bR' and move.endRow == 0:
+            if move.endCol == 0:
+                self.currentCastle.bqs = False
+            elif move.endCol == 7:
+                self.currentCastle.bks = False
             
     '''
-    Determine if square can be attacked
+    Count the leaf nodes of the legal move tree to the given depth (checks move generation, see perft.py)
+    '''
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.validMoves()
+        if depth == 1: #no need to make the last moves, just count them
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.makeMove(move)
+            nodes += self.perft(depth - 1)
+            self.undoMove()
+        return nodes
+
+    '''
+    Perft split by first move: returns a dictionary of move notation (ex: e2e4) -> leaf node count
+    '''
+    def divide(self, depth):
+        counts = {}
+        for move in self.validMoves():
+            self.makeMove(move)
+            counts[move.getChessNotation()] = self.perft(depth - 1)
+            self.undoMove()
+        return counts
+
+    '''
+    Compute the zobrist key of the current position from scratch
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for row in range(len(self.board)):
+            for col in range(len(self.board[row])):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][row * 8 + col]
+        key ^= ZOBRIST_CASTLE[self.currentCastle.index()]
+        key ^= self.enPassantKey()
+        if not self.whiteMove:
+            key ^= ZOBRIST_BLACK_MOVE
+        return key
+
+    '''
+    Whether the side to move has a pawn next to the pawn that just moved two squares, so it can take en passant
+    (pins aside). Only then does the en passant square make the position different
+    '''
+    def enPassantCapturePossible(self):
+        if self.enPassantPossible == ():
+            return False
+        row, col = self.enPassantPossible
+        pawnRow = row + 1 if self.whiteMove else row - 1 #where a pawn that can take en passant stands
+        pawn = 'wp' if self.whiteMove else 'bp'
+        return (col > 0 and self.board[pawnRow][col - 1] == pawn) or (col < 7 and self.board[pawnRow][col + 1] == pawn)
+
+    '''
+    Zobrist number of the en passant file, 0 when no en passant capture is possible: a double pawn push
+    nobody can take gives the same key as the position reached without it (or loaded from a FEN with "-")
+    '''
+    def enPassantKey(self):
+        return ZOBRIST_EN_PASSANT[self.enPassantPossible[1]] if self.enPassantCapturePossible() else 0
+
+    '''
+    Debug check that the incrementally updated zobrist key matches a full recompute
+    '''
+    def checkZobristKey(self):
+        expected = self.computeZobristKey()
+        if self.zobristKey != expected:
+            raise AssertionError("zobrist key out of sync: " + hex(self.zobristKey) + " != " + hex(expected))
+
+    '''
+    How many times the current position occurred before in the game, counting up to stopAt. Positions are
+    compared by zobrist key (pieces, side to move, castle and en passant rights). Nothing before the last
+    capture or pawn move can come back, and only every second position has the same side to move, so at
+    most halfmoveClock / 2 keys of zobristLog are looked at
+    '''
+    def repetitions(self, stopAt = 2):
+        log = self.zobristLog
+        key = self.zobristKey
+        oldest = max(len(log) - self.halfmoveClock, 0) #first position after the last irreversible move
+        count = 0
+        for i in range(len(log) - 2, oldest - 1, -2):
+            if log[i] == key:
+                count += 1
+                if count >= stopAt:
+                    break
+        return count
+
+    '''
+    Draw by threefold repetition or the fifty-move rule (checkmate and stalemate are set by validMoves). A move
+    that checkmates on the hundredth ply still wins, the fifty-move rule only applies when there is no mate
+    '''
+    def isDraw(self):
+        if self.repetitions(2) >= 2:
+            return True
+        return self.halfmoveClock >= FIFTY_MOVE_PLIES and (not self.kingInCheck() or len(self.validMoves()) > 0)
+
+    '''
+    Material + position score of the whole board from scratch (makeMove/undoMove keep self.score up to date)
+    '''
+    def computeScore(self):
+        scores = evaluation.PIECE_SQUARE_SCORES
+        score = 0
+        for row in range(len(self.board)):
+            for col in range(len(self.board[row])):
+                piece = self.board[row][col]
+                if piece != "--":
+                    score += scores[piece][row * 8 + col]
+        return score
+
+    '''
+    Whether the side to move is in check, from the board (self.inCheck is only set by move generation)
+    '''
+    def kingInCheck(self):
+        if self.whiteMove:
+            return self.isSquareAttacked(self.whiteKing, "b")
+        return self.isSquareAttacked(self.blackKing, "w")
+
+    '''
+    Whether color has any piece besides its king and pawns (in pawn endings passing can be the best move,
+    so null move pruning is turned off there)
+    '''
+    def hasPieces(self, color):
+        for row in self.board:
+            for piece in row:
+                if piece[0] == color and piece[1] in "NBRQ":
+                    return True
+        return False
+
+    '''
+    Determine if square can be attacked by the opponent of the side to move
     '''
     def squareUnderAttack(self, row, col):
-        self.whiteMove = not self.whiteMove
-        enemyMoves = self.getAllPossibleMoves()
-        self.whiteMove = not self.whiteMove
-        for move in enemyMoves:
-            if move.endRow == row and move.endCol == col:
+        return self.isSquareAttacked((row, col), "b" if self.whiteMove else "w")
+
+    '''
+    Check if any piece of byColor attacks square sq = (row, col), by looking outwards from the square
+    for a pawn, knight or king next to it or a slider at the end of a ray
+    '''
+    def isSquareAttacked(self, sq, byColor):
+        row, col = sq
+        board = self.board
+        index = row * 8 + col
+        #a pawn attacking the square stands one row behind it, seen from the pawn's side
+        pawnRow = row + 1 if byColor == 'w' else row - 1
+        if 0 <= pawnRow < 8:
+            pawn = byColor + 'p'
+            if (col > 0 and board[pawnRow][col - 1] == pawn) or (col < 7 and board[pawnRow][col + 1] == pawn):
+                return True
+        knight = byColor + 'N'
+        for endRow, endCol, endSq in KNIGHT_SQUARES[index]:
+            if board[endRow][endCol] == knight:
+                return True
+        king = byColor + 'K'
+        for endRow, endCol, endSq in KING_SQUARES[index]:
+            if board[endRow][endCol] == king:
                 return True
+        queen = byColor + 'Q'
+        rays = RAY_SQUARES[index]
+        for d in range(8):
+            slider = byColor + ('R' if d < 4 else 'B')
+            for endRow, endCol, endSq in rays[d]:
+                piece = board[endRow][endCol]
+                if piece != "--":
+                    if piece == slider or piece == queen:
+                        return True
+                    break #first piece on the ray blocks the rest
         return False
+
                     
                     
 class CastleRights():
@@ -524,9 +1020,45 @@ class CastleRights():
         self.bks = bks
         self.wqs = wqs
         self.bqs = bqs
+
+    '''
+    Pack the four rights into a number from 0 to 15 (wks = 1, bks = 2, wqs = 4, bqs = 8)
+    '''
+    def index(self):
+        return self.wks | (self.bks << 1) | (self.wqs << 2) | (self.bqs << 3)
                        
     
+#packed moves: a move in one int, start square | end square << 6 | promotion piece << 12 | flags
+#(squares are row * 8 + col, promotion piece is its index in Move.promotionPieces). The low 14 bits
+#identify the move (Move.moveID): a queen promotion has the same ID as the plain pawn move to the back rank
+PACKED_ID_MASK = 0x3FFF
+PACKED_EN_PASSANT = 1 << 14
+PACKED_CASTLE = 1 << 15
+PACKED_PROMOTION = 1 << 16
+MOVE_CACHE = {} #(packed move, piece moved, piece captured) -> Move, see packedMove
+
+'''
+The Move for packed move on board. Moves are never changed once made, so every position where the same
+piece makes the same move and takes the same piece shares one Move object, built the first time it is seen;
+the generators don't allocate a new object (and garbage) for every move of every position
+'''
+def packedMove(packed, board):
+    start = packed & 63
+    end = (packed >> 6) & 63
+    key = (packed, board[start >> 3][start & 7], board[end >> 3][end & 7])
+    move = MOVE_CACHE.get(key)
+    if move is None:
+        move = MOVE_CACHE[key] = Move(divmod(start, 8), divmod(end, 8), board,
+                                      enPassant = bool(packed & PACKED_EN_PASSANT),
+                                      pawnPromotion = bool(packed & PACKED_PROMOTION),
+                                      castle = bool(packed & PACKED_CASTLE),
+                                      promotionPiece = Move.promotionPieces[(packed >> 12) & 3])
+    return move
+
 class Move():
+    #fixed attributes instead of a __dict__ per move, thousands are made for every searched position
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "enPassant",
+                 "pawnPromotion", "promotionPiece", "castle", "isCapture", "moveID", "packed")
     #maps keys to values (key : value)
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4,
                   "5": 3, "6": 2, "7": 1, "8": 0}
@@ -534,8 +1066,9 @@ class Move():
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3,
                   "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
+    promotionPieces = ("Q", "R", "B", "N") #queen first, it is almost always the best choice
         
-    def __init__(self, startSq, endSq, board, enPassant = False, pawnPromotion = False, castle = False):
+    def __init__(self, startSq, endSq, board, enPassant = False, pawnPromotion = False, castle = False, promotionPiece = 'Q'):
         self.startRow = startSq[0]
         self.startCol = startSq[1] #keeps tracks of starting square
         self.endRow = endSq[0] 
@@ -544,11 +1077,22 @@ class Move():
         self.pieceCaptured = board[self.endRow][self.endCol] #keeps track of pieces moved & captured
         self.enPassant = enPassant
         self.pawnPromotion = pawnPromotion
+        self.promotionPiece = promotionPiece #piece type the pawn turns into if pawnPromotion
         self.castle = castle
         if enPassant:
             self.pieceCaptured = 'bp' if self.pieceMoved == 'wp' else 'wp'
         self.isCapture = self.pieceCaptured != '--'
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol #gives each move a unique ID
+        self.moveID = (self.startRow * 8 + self.startCol) | ((self.endRow * 8 + self.endCol) << 6) #gives each move a unique ID
+        if pawnPromotion: #under promotions get their own IDs, queen promotions keep the plain ID
+            self.moveID |= self.promotionPieces.index(promotionPiece) << 12
+            self.packed = self.moveID | PACKED_PROMOTION
+        elif enPassant:
+            self.packed = self.moveID | PACKED_EN_PASSANT
+        elif castle:
+            self.packed = self.moveID | PACKED_CASTLE
+        else:
+            self.packed = self.moveID
+
         
     '''
     Overriding the equals method
@@ -557,9 +1101,41 @@ class Move():
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
+
+    def __hash__(self):
+        return self.moveID
         
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.pawnPromotion:
+            notation += self.promotionPiece.lower() #ex: e7e8q
+        return notation
+
+    '''
+    Standard algebraic notation of the move, without the check suffix (validMoves: every move of the position)
+    '''
+    def getSanNotation(self, validMoves):
+        if self.castle:
+            return "O-O" if self.endCol == 6 else "O-O-O"
+        endSquare = self.getRankFile(self.endRow, self.endCol)
+        piece = self.pieceMoved[1]
+        if piece == 'p':
+            notation = (self.colsToFiles[self.startCol] + "x" if self.isCapture else "") + endSquare
+            if self.pawnPromotion:
+                notation += "=" + self.promotionPiece
+            return notation
+        #other pieces of the same type that can reach the same square need the start file or rank
+        others = [other for other in validMoves if other.pieceMoved == self.pieceMoved and other != self and
+                  (other.endRow, other.endCol) == (self.endRow, self.endCol)]
+        start = ""
+        if others:
+            if all(other.startCol != self.startCol for other in others):
+                start = self.colsToFiles[self.startCol]
+            elif all(other.startRow != self.startRow for other in others):
+                start = self.rowsToRanks[self.startRow]
+            else:
+                start = self.getRankFile(self.startRow, self.startCol)
+        return piece + start + ("x" if self.isCapture else "") + endSquare
         
     def getRankFile(self, row, col):
         return self.colsToFiles[col] + self.rowsToRanks[row]
@@ -575,9 +1151,10 @@ class Move():
         #pawn moves
         if self.pieceMoved[1] == 'p':
             if self.isCapture:
-                return self.colsToFiles[self.startCol] + "x" + endSquare
-            else:
-                return endSquare
+                endSquare = self.colsToFiles[self.startCol] + "x" + endSquare
+            if self.pawnPromotion:
+                endSquare += "=" + self.promotionPiece
+            return endSquare
             
         #other piece moves
         moveString = self.pieceMoved[1]
@@ -0,0 +1,173 @@
+'''
+Batch analysis: searches every position of an EPD/FEN file on a pool of worker processes and writes one
+JSON line per position (best move, score, nodes, time) as results come in. Positions are streamed, so
+memory stays bounded whatever the file size, and an interrupted run can continue where it stopped
+
+usage: python analyze.py INPUT OUTPUT [--depth N] [--movetime SECONDS] [--nodes N] [--workers N] [--resume]
+'''
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+import ChessEngine
+import chessAI
+import transposition
+
+TASKS_PER_WORKER = 4 #positions queued ahead per worker, bounds the memory used by pending work
+
+'''
+Yield (line number, FEN, EPD operations) for each position line of path after line number skip.
+A line is a full FEN or EPD: 4 position fields followed by operations like bm Nf3; id "test 1";
+'''
+def readPositions(path, skip = 0):
+    with open(path) as positionFile:
+        for number, line in enumerate(positionFile, 1):
+            if number <= skip:
+                continue
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            yield (number,) + parseEPD(line)
+
+'''
+Split an EPD/FEN line into (FEN, {operation: value})
+'''
+def parseEPD(line):
+    fields = line.split()
+    fen = " ".join(fields[:4])
+    rest = fields[4:]
+    if len(rest) >= 2 and rest[0].isdigit() and rest[1].isdigit(): #FEN move counters
+        fen += " " + rest[0] + " " + rest[1]
+        rest = rest[2:]
+    operations = {}
+    for operation in " ".join(rest).split(";"):
+        name, _, value = operation.strip().partition(" ")
+        if name:
+            operations[name] = value.strip().strip('"')
+    return fen, operations
+
+#search objects of a pool process, reused for every position it analyzes
+workerState = None
+workerSearcher = None
+
+'''
+Runs once in every pool process
+'''
+def initWorker(backend, depth, timeLimit, maxNodes, hashMB, nullMove, lateMoveReductions):
+    global workerState, workerSearcher
+    workerState = ChessEngine.GameState(backend)
+    workerSearcher = chessAI.Searcher(depth, timeLimit, maxNodes, transposition.TranspositionTable(hashMB),
+                                      nullMove = nullMove, lateMoveReductions = lateMoveReductions)
+
+'''
+Search one position: task is (line number, FEN, EPD operations). Returns the result as a dict
+'''
+def analyzePosition(task):
+    number, fen, operations = task
+    result = {"line": number, "fen": fen}
+    if "id" in operations:
+        result["id"] = operations["id"]
+    try:
+        workerState.loadFEN(fen)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    validMoves = workerState.validMoves()
+    if not validMoves:
+        result["error"] = "checkmate" if workerState.checkMate else "stalemate"
+        return result
+    searched = workerSearcher.search(workerState, validMoves)
+    result.update({"bestmove": searched.move.getChessNotation(), "score": round(searched.score, 2),
+                   "depth": searched.depth, "nodes": searched.nodes, "time": round(searched.elapsed, 3),
+                   "pv": [move.getChessNotation() for move in searched.pv]})
+    return result
+
+'''
+Line number of the last position in an existing output file (0 if there is none). A last line cut off
+in the middle of writing is removed, so it gets analyzed again
+'''
+def lastCompletedLine(outputPath):
+    if not os.path.exists(outputPath):
+        return 0
+    last = 0
+    with open(outputPath, "rb+") as outputFile:
+        complete = 0 #bytes up to the end of the last complete line
+        for line in outputFile:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                last = json.loads(line)["line"]
+            except (ValueError, KeyError):
+                break
+            complete += len(line)
+        outputFile.truncate(complete)
+    return last
+
+'''
+Analyze every position of inputPath, appending results to outputPath in input order. With resume, positions
+up to the last one already in outputPath are skipped. Returns the number of positions analyzed
+'''
+def analyzeFile(inputPath, outputPath, depth = chessAI.DEPTH, timeLimit = None, maxNodes = None, workers = 1,
+                backend = "mailbox", hashMB = chessAI.TT_SIZE_MB, resume = False, nullMove = True,
+                lateMoveReductions = True, out = sys.stderr):
+    skip = lastCompletedLine(outputPath) if resume else 0
+    if not resume and os.path.exists(outputPath):
+        open(outputPath, "w").close()
+    tasks = readPositions(inputPath, skip)
+    start = time.perf_counter()
+    count = 0
+    initArgs = (backend, depth, timeLimit, maxNodes, hashMB, nullMove, lateMoveReductions)
+    with open(outputPath, "a") as outputFile, \
+         multiprocessing.Pool(workers, initializer = initWorker, initargs = initArgs) as pool:
+        #Pool.imap would read the whole input ahead, so keep a bounded window of submitted positions instead
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(analyzePosition, (task,)))
+            if len(pending) >= workers * TASKS_PER_WORKER:
+                count += writeResult(outputFile, pending.popleft().get())
+        while pending:
+            count += writeResult(outputFile, pending.popleft().get())
+    elapsed = time.perf_counter() - start
+    out.write("%d positions in %.1fs (%.1f per second)%s\n" % (count, elapsed, count / elapsed if elapsed > 0 else 0,
+                                                                " after line " + str(skip) if skip else ""))
+    return count
+
+'''
+Append one result line and flush it, so everything written survives an interruption
+'''
+def writeResult(outputFile, result):
+    outputFile.write(json.dumps(result) + "\n")
+    outputFile.flush()
+    return 1
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Analyze the positions of an EPD/FEN file with ChessEngine")
+    parser.add_argument("input", help = "EPD or FEN file, one position per line")
+    parser.add_argument("output", help = "JSON lines file results are written to")
+    parser.add_argument("--depth", type = int, help = "search depth (default %d, or no limit with --movetime)" % chessAI.DEPTH)
+    parser.add_argument("--movetime", type = float, help = "seconds per position")
+    parser.add_argument("--nodes", type = int, help = "nodes per position")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(),
+                        help = "positions analyzed at the same time (default: number of CPUs)")
+    parser.add_argument("--backend", choices = ("mailbox", "bitboard"), default = "bitboard")
+    parser.add_argument("--hash", type = int, default = chessAI.TT_SIZE_MB, help = "transposition table MB per worker")
+    parser.add_argument("--resume", action = "store_true", help = "continue after the last position in OUTPUT")
+    parser.add_argument("--no-null-move", action = "store_true", help = "turn off null move pruning")
+    parser.add_argument("--no-lmr", action = "store_true", help = "turn off late move reductions")
+    args = parser.parse_args(argv)
+
+    depth = args.depth
+    if depth is None:
+        depth = chessAI.MAX_DEPTH if args.movetime or args.nodes else chessAI.DEPTH
+    analyzeFile(args.input, args.output, depth, args.movetime, args.nodes, args.workers, args.backend,
+                args.hash, args.resume, not args.no_null_move, not args.no_lmr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
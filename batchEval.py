@@ -0,0 +1,161 @@
+'''
+Batch evaluation with NumPy: encodes many positions as an (N, 12, 64) int8 array of piece planes and scores
+all of them with one dot product against the material + position tables of evaluation.py. The scores are
+identical to chessAI.scoreBoard, for scoring position sets and generating training data.
+NumPy is only needed by this module, the engine and the game run without it
+
+usage: python batchEval.py [FILE] [--count N] [--seed N]
+'''
+
+import argparse
+import random
+import sys
+import time
+import numpy as np
+import ChessEngine
+import chessAI
+import evaluation
+
+#one plane per piece, in this order
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+PLANES = {piece: plane for plane, piece in enumerate(PIECES)}
+SQUARE_CODES = {piece: plane + 1 for piece, plane in PLANES.items()} #board square -> plane + 1, 0 when empty
+SQUARE_CODES["--"] = 0
+PLANE_CODES = np.arange(1, len(PIECES) + 1, dtype = np.int8).reshape(-1, 1)
+FEN_PIECES = {(piece[1].upper() if piece[0] == "w" else piece[1].lower()): piece for piece in PIECES}
+
+#(12, 64) material + position score of every piece on every square in tenths of a point, positive for white
+SCORE_MATRIX = np.array([evaluation.PIECE_SQUARE_SCORES[piece] for piece in PIECES], dtype = np.int32)
+
+'''
+Encode boards (8x8 lists like GameState.board) as an (N, 12, 64) int8 array, 1 where the piece of a
+plane stands on a square (index row * 8 + col)
+'''
+def encodeBoards(boards):
+    boards = list(boards)
+    #(N, 64) square codes in one pass, then every plane compares the codes with its own
+    codes = np.fromiter((SQUARE_CODES[piece] for board in boards for row in board for piece in row),
+                        dtype = np.int8, count = len(boards) * 64).reshape(-1, 64)
+    return (codes[:, np.newaxis, :] == PLANE_CODES).astype(np.int8)
+
+'''
+Encode the piece placement of FENs (or EPD lines) as an (N, 12, 64) int8 array, without building GameStates
+'''
+def encodeFENs(fens):
+    fens = list(fens)
+    planes = np.zeros((len(fens), len(PIECES), 64), dtype = np.int8)
+    positions, pieceIndexes, squares = [], [], []
+    for position, fen in enumerate(fens):
+        sq = 0
+        for char in fen.split(None, 1)[0]:
+            if char.isdigit():
+                sq += int(char)
+            elif char != "/":
+                positions.append(position)
+                pieceIndexes.append(PLANES[FEN_PIECES[char]])
+                squares.append(sq)
+                sq += 1
+    planes[positions, pieceIndexes, squares] = 1
+    return planes
+
+'''
+Material + position scores of encoded positions in points, positive when white is ahead (the same
+values as chessAI.scoreBoard gives positions that aren't over)
+'''
+def scorePlanes(planes):
+    #integer tenths first so the result matches the incremental GameState.score exactly. einsum sums the
+    #int8 planes times the int32 scores without first copying the planes to int32 (3x faster than matmul)
+    tenths = np.einsum("npq,pq->n", planes, SCORE_MATRIX)
+    return tenths * evaluation.pointMultiplier
+
+'''
+chessAI.scoreBoard of every GameState in states as an array. Checkmate and stalemate are taken from the
+states, like scoreBoard does, so call validMoves first where it matters
+'''
+def scoreStates(states):
+    states = list(states)
+    scores = scorePlanes(encodeBoards(gs.board for gs in states))
+    for i, gs in enumerate(states):
+        if gs.checkMate:
+            scores[i] = -chessAI.CHECKMATE if gs.whiteMove else chessAI.CHECKMATE
+        elif gs.staleMate:
+            scores[i] = chessAI.STALEMATE
+    return scores
+
+'''
+Count positions from random games (seeded), for benchmarking when no position file is given
+'''
+def randomPositions(count, seed = 0):
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        gs = ChessEngine.GameState()
+        for ply in range(rng.randint(1, 120)):
+            validMoves = gs.validMoves()
+            if not validMoves:
+                break
+            gs.makeMove(rng.choice(validMoves))
+        gs.validMoves() #sets checkMate and staleMate
+        states.append(gs)
+    return states
+
+'''
+Score states one at a time with chessAI.scoreBoard and all at once with scoreStates, check that the
+results agree and report positions per second of each step
+'''
+def benchmark(states, out = sys.stdout):
+    start = time.perf_counter()
+    expected = [chessAI.scoreBoard(gs) for gs in states]
+    loopSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    planes = encodeBoards(gs.board for gs in states)
+    encodeSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scorePlanes(planes)
+    scoreSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = scoreStates(states)
+    batchSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for gs in states:
+        chessAI.scoreBoardFullScan(gs)
+    fullScanSeconds = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, scores) if a != b)
+    count = len(states)
+    rate = lambda seconds: count / seconds if seconds > 0 else float("inf")
+    out.write("%d positions, %d mismatches with scoreBoard\n" % (count, mismatches))
+    out.write("%-34s %14.0f positions/s\n" % ("scoreBoard (incremental score)", rate(loopSeconds)))
+    out.write("%-34s %14.0f positions/s\n" % ("scoreBoardFullScan (board loops)", rate(fullScanSeconds)))
+    out.write("%-34s %14.0f positions/s\n" % ("scoreStates (encode + dot)", rate(batchSeconds)))
+    out.write("%-34s %14.0f positions/s\n" % ("  encodeBoards", rate(encodeSeconds)))
+    out.write("%-34s %14.0f positions/s\n" % ("  scorePlanes", rate(scoreSeconds)))
+    return mismatches
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the NumPy batch evaluator against chessAI.scoreBoard")
+    parser.add_argument("file", nargs = "?", help = "EPD or FEN file to score (default: positions from random games)")
+    parser.add_argument("--count", type = int, default = 10000, help = "random positions to generate (default 10000)")
+    parser.add_argument("--seed", type = int, default = 0, help = "random seed of the generated games")
+    args = parser.parse_args(argv)
+
+    if args.file:
+        states = []
+        with open(args.file) as positionFile:
+            for line in positionFile:
+                fields = line.split()
+                if fields and not fields[0].startswith("#"):
+                    try:
+                        states.append(ChessEngine.GameState.fromFEN(" ".join(fields[:4])))
+                    except ValueError as error:
+                        parser.error(str(error))
+        for gs in states:
+            gs.validMoves()
+    else:
+        states = randomPositions(args.count, args.seed)
+    return 1 if benchmark(states) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+'''
+Bitboard backend for GameState: the position is kept as twelve 64 bit piece sets plus occupancy masks,
+so move generation and attack tests become mask operations instead of walking the 2D board
+'''
+#squares are numbered row * 8 + col to match GameState.board (square 0 is a8, square 63 is h1)
+
+import ChessEngine
+
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+FULL = (1 << 64) - 1 #every square on the board
+
+'''
+Build a table holding, for every square, the mask of squares reached by a single step of each offset
+'''
+def stepTable(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        for dRow, dCol in offsets:
+            endRow = row + dRow
+            endCol = col + dCol
+            if 0 <= endRow < 8 and 0 <= endCol < 8: #valid board square
+                mask |= 1 << (endRow * 8 + endCol)
+        table.append(mask)
+    return table
+
+KNIGHT_ATTACKS = stepTable(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = stepTable(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+#squares a pawn of each color attacks from a given square (white moves up the board, black moves down)
+PAWN_ATTACKS = {"w": stepTable(((-1, -1), (-1, 1))), "b": stepTable(((1, -1), (1, 1)))}
+
+#sliding directions (row,col): the first four are rook directions, the last four are bishop directions
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+#True if a direction walks towards higher square numbers (the nearest blocker is then the lowest set bit)
+POSITIVE = tuple(d[0] * 8 + d[1] > 0 for d in DIRECTIONS)
+
+'''
+Build the ray masks for every direction and square, stopping at the edge of the board
+'''
+def rayTable():
+    rays = []
+    for dRow, dCol in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            row, col = divmod(sq, 8)
+            mask = 0
+            for i in range(1, 8): #can move a max of 7 squares
+                endRow = row + dRow * i
+                endCol = col + dCol * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8):
+                    break #off the board
+                mask |= 1 << (endRow * 8 + endCol)
+            table.append(mask)
+        rays.append(table)
+    return rays
+
+RAYS = rayTable()
+
+'''
+Build the masks of squares strictly between two squares on a shared line (0 if they are not aligned)
+'''
+def betweenTable():
+    table = [[0] * 64 for _ in range(64)]
+    for d in range(len(DIRECTIONS)):
+        for sq in range(64):
+            ray = RAYS[d][sq]
+            while ray:
+                low = ray & -ray
+                target = low.bit_length() - 1
+                table[sq][target] = RAYS[d][sq] & ~RAYS[d][target] & ~low
+                ray ^= low
+    return table
+
+BETWEEN = betweenTable()
+
+'''
+Squares attacked along one direction, up to and including the first blocker
+'''
+def rayAttacks(sq, d, occupied):
+    ray = RAYS[d][sq]
+    blockers = ray & occupied
+    if blockers:
+        if POSITIVE[d]:
+            first = (blockers & -blockers).bit_length() - 1 #nearest blocker is the lowest bit
+        else:
+            first = blockers.bit_length() - 1 #nearest blocker is the highest bit
+        ray ^= RAYS[d][first] #cut off everything behind the blocker
+    return ray
+
+def rookAttacks(sq, occupied):
+    return (rayAttacks(sq, 0, occupied) | rayAttacks(sq, 1, occupied) |
+            rayAttacks(sq, 2, occupied) | rayAttacks(sq, 3, occupied))
+
+def bishopAttacks(sq, occupied):
+    return (rayAttacks(sq, 4, occupied) | rayAttacks(sq, 5, occupied) |
+            rayAttacks(sq, 6, occupied) | rayAttacks(sq, 7, occupied))
+
+
+class BitboardGameState(ChessEngine.GameState):
+    def __init__(self, backend = "bitboard"):
+        super().__init__()
+        self.backend = "bitboard"
+        self.loadBitboards()
+
+    '''
+    Set up the position of a FEN string, on the 2D board and the bitboards
+    '''
+    def loadFEN(self, fen):
+        super().loadFEN(fen)
+        self.loadBitboards()
+
+    '''
+    Rebuild every piece set and occupancy mask from the 2D board
+    '''
+    def loadBitboards(self):
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.occupancy = {"w": 0, "b": 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.bitboards[piece] |= 1 << (row * 8 + col)
+                    self.occupancy[piece[0]] |= 1 << (row * 8 + col)
+
+    '''
+    Takes move as a parameter and executes it on both the 2D board and the bitboards
+    '''
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    '''
+    Undos the last move made on both the 2D board and the bitboards
+    '''
+    def undoMove(self):
+        if len(self.moveLog) != 0: #make sure there is a move to undo
+            move = self.moveLog[-1]
+            super().undoMove()
+            self.toggleMove(move)
+
+    '''
+    Flip the bits a move changes (xor is its own inverse, so this both makes and unmakes the move)
+    '''
+    def toggleMove(self, move):
+        bitboards = self.bitboards
+        color = move.pieceMoved[0]
+        start = 1 << (move.startRow * 8 + move.startCol)
+        end = 1 << (move.endRow * 8 + move.endCol)
+        bitboards[move.pieceMoved] ^= start
+        bitboards[color + move.promotionPiece if move.pawnPromotion else move.pieceMoved] ^= end
+        self.occupancy[color] ^= start | end
+        if move.pieceCaptured != "--":
+            captured = 1 << (move.startRow * 8 + move.endCol) if move.enPassant else end
+            bitboards[move.pieceCaptured] ^= captured
+            self.occupancy[move.pieceCaptured[0]] ^= captured
+        if move.castle:
+            row = move.endRow * 8
+            if move.endCol == 6: #kingside, rook goes from column 7 to 5
+                rook = (1 << (row + 7)) | (1 << (row + 5))
+            else: #queenside, rook goes from column 0 to 3
+                rook = (1 << row) | (1 << (row + 3))
+            bitboards[color + 'R'] ^= rook
+            self.occupancy[color] ^= rook
+
+    '''
+    Mask of the pieces of color byColor that attack square sq, given the occupied squares
+    '''
+    def attackersTo(self, sq, byColor, occupied):
+        bitboards = self.bitboards
+        queens = bitboards[byColor + 'Q']
+        #a pawn of byColor attacks sq from the squares an opposing pawn on sq would attack
+        return ((PAWN_ATTACKS["b" if byColor == "w" else "w"][sq] & bitboards[byColor + 'p']) |
+                (KNIGHT_ATTACKS[sq] & bitboards[byColor + 'N']) |
+                (KING_ATTACKS[sq] & bitboards[byColor + 'K']) |
+                (rookAttacks(sq, occupied) & (bitboards[byColor + 'R'] | queens)) |
+                (bishopAttacks(sq, occupied) & (bitboards[byColor + 'B'] | queens)))
+
+    '''
+    Determine if square can be attacked
+    '''
+    def squareUnderAttack(self, row, col):
+        them = "b" if self.whiteMove else "w"
+        return self.attackersTo(row * 8 + col, them, self.occupancy["w"] | self.occupancy["b"]) != 0
+
+    '''
+    Check if any piece of byColor attacks square sq = (row, col)
+    '''
+    def isSquareAttacked(self, sq, byColor):
+        return self.attackersTo(sq[0] * 8 + sq[1], byColor, self.occupancy["w"] | self.occupancy["b"]) != 0
+
+    '''
+    Whether color has any piece besides its king and pawns
+    '''
+    def hasPieces(self, color):
+        bitboards = self.bitboards
+        return (bitboards[color + 'N'] | bitboards[color + 'B'] | bitboards[color + 'R'] | bitboards[color + 'Q']) != 0
+
+    '''
+    Returns a dictionary of pinned square -> mask of squares the pinned piece may still move to
+    '''
+    def pinMasks(self, kingSq, us, them, occupied):
+        pins = {}
+        own = self.occupancy[us]
+        bitboards = self.bitboards
+        rookLike = bitboards[them + 'R'] | bitboards[them + 'Q']
+        bishopLike = bitboards[them + 'B'] | bitboards[them + 'Q']
+        for d in range(len(DIRECTIONS)):
+            sliders = rookLike if d < 4 else bishopLike
+            if not RAYS[d][kingSq] & sliders:
+                continue #no enemy slider on this line
+            ray = rayAttacks(kingSq, d, occupied)
+            blocker = ray & own #first piece seen from the king, if it is ours
+            if blocker:
+                pinnedSq = blocker.bit_length() - 1
+                beyond = rayAttacks(pinnedSq, d, occupied)
+                if beyond & sliders: #enemy slider right behind it, piece is pinned
+                    pins[pinnedSq] = ray | beyond
+        return pins
+
+    '''
+    All moves considering checks, generated with mask operations
+    '''
+    def validMoves(self):
+        moves = self.generateMoves(False)
+        self.updateGameEnd(moves)
+        return moves
+
+    '''
+    Legal captures and promotions only (used by quiescence search), every legal move when in check
+    '''
+    def captureMoves(self):
+        moves = self.generateMoves(True)
+        if self.inCheck: #all evasions were generated, so mate is known
+            self.updateGameEnd(moves)
+        else: #without every move we can't tell stalemate
+            self.checkMate = False
+            self.staleMate = False
+        return moves
+
+    '''
+    Set checkMate/staleMate from the complete list of legal moves
+    '''
+    def updateGameEnd(self, moves):
+        if len(moves) == 0:
+            if self.inCheck:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+
+    '''
+    Generate legal moves; with capturesOnly (and not in check) only captures and promotions
+    '''
+    def generateMoves(self, capturesOnly):
+        packedMove = ChessEngine.packedMove
+        board = self.board
+        bitboards = self.bitboards
+        us, them = ("w", "b") if self.whiteMove else ("b", "w")
+        own = self.occupancy[us]
+        enemy = self.occupancy[them]
+        occupied = own | enemy
+        kingBit = bitboards[us + 'K']
+        kingSq = kingBit.bit_length() - 1
+        checkers = self.attackersTo(kingSq, them, occupied)
+        self.inCheck = checkers != 0
+        capturesOnly = capturesOnly and not checkers #in check every evasion is needed
+        targetMask = enemy if capturesOnly else ~own #squares pieces may move to
+        moves = []
+
+        if checkers & (checkers - 1): #double check, king must move
+            self.getBitboardKingMoves(kingSq, us, them, occupied, targetMask, moves)
+        else:
+            if checkers: #only one check (capture the checker or block the line)
+                checkSq = checkers.bit_length() - 1
+                checkMask = checkers | BETWEEN[kingSq][checkSq]
+            else:
+                checkMask = FULL
+            pins = self.pinMasks(kingSq, us, them, occupied)
+            if us == "w":
+                forward, startRow, backRow = -8, 6, 0
+            else:
+                forward, startRow, backRow = 8, 1, 7
+            #go through our pieces in board order
+            pieces = own
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                sq = low.bit_length() - 1
+                row, col = divmod(sq, 8)
+                piece = board[row][col][1]
+                if piece == 'K':
+                    self.getBitboardKingMoves(sq, us, them, occupied, targetMask, moves)
+                    continue
+                allowed = checkMask & pins.get(sq, FULL)
+                if piece == 'p':
+                    one = sq + forward
+                    if capturesOnly:
+                        #pushes only count when they promote
+                        if one // 8 == backRow and not (occupied >> one) & 1 and (1 << one) & allowed:
+                            self.addPawnMoves((row, col), divmod(one, 8), moves, True)
+                    elif not (occupied >> one) & 1: #one square pawn advance
+                        if (1 << one) & allowed:
+                            self.addPawnMoves((row, col), divmod(one, 8), moves, one // 8 == backRow)
+                        two = one + forward
+                        if row == startRow and not (occupied >> two) & 1 and (1 << two) & allowed: #two square pawn advance
+                            moves.append(packedMove(sq | two << 6, board))
+                    targets = PAWN_ATTACKS[us][sq] & enemy & allowed
+                    while targets:
+                        end = targets & -targets
+                        targets ^= end
+                        endRow, endCol = divmod(end.bit_length() - 1, 8)
+                        self.addPawnMoves((row, col), (endRow, endCol), moves, endRow == backRow)
+                    if self.enPassantPossible != ():
+                        epSq = self.enPassantPossible[0] * 8 + self.enPassantPossible[1]
+                        if (PAWN_ATTACKS[us][sq] >> epSq) & 1 and self.enPassantLegal(sq, epSq, kingSq, them, occupied, checkers, checkMask):
+                            moves.append(packedMove(sq | epSq << 6 | ChessEngine.PACKED_EN_PASSANT, board))
+                    continue
+                if piece == 'N':
+                    targets = KNIGHT_ATTACKS[sq] if sq not in pins else 0 #pinned knights can never move
+                elif piece == 'B':
+                    targets = bishopAttacks(sq, occupied)
+                elif piece == 'R':
+                    targets = rookAttacks(sq, occupied)
+                else: #queen
+                    targets = rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+                targets &= targetMask & allowed
+                while targets:
+                    end = targets & -targets
+                    targets ^= end
+                    moves.append(packedMove(sq | (end.bit_length() - 1) << 6, board))
+            if not checkers and not capturesOnly:
+                self.getBitboardCastleMoves(kingSq, us, them, occupied, moves)
+        return moves
+
+    '''
+    Get all king moves that don't step onto an attacked square
+    '''
+    def getBitboardKingMoves(self, kingSq, us, them, occupied, targetMask, moves):
+        withoutKing = occupied ^ (1 << kingSq) #king can't hide behind its own square from a slider
+        targets = KING_ATTACKS[kingSq] & ~self.occupancy[us] & targetMask
+        while targets:
+            end = targets & -targets
+            targets ^= end
+            endSq = end.bit_length() - 1
+            if not self.attackersTo(endSq, them, withoutKing):
+                moves.append(ChessEngine.packedMove(kingSq | endSq << 6, self.board))
+
+    '''
+    En passant is legal if it deals with any check and removing both pawns doesn't expose the king to a slider
+    '''
+    def enPassantLegal(self, sq, epSq, kingSq, them, occupied, checkers, checkMask):
+        capturedSq = (sq // 8) * 8 + epSq % 8
+        if checkers and not ((1 << epSq) & checkMask or (1 << capturedSq) & checkers):
+            return False
+        after = (occupied ^ (1 << sq) ^ (1 << capturedSq)) | (1 << epSq)
+        bitboards = self.bitboards
+        queens = bitboards[them + 'Q']
+        return not ((rookAttacks(kingSq, after) & (bitboards[them + 'R'] | queens)) or
+                    (bishopAttacks(kingSq, after) & (bitboards[them + 'B'] | queens)))
+
+    '''
+    Generate castle moves for a king on its starting square that is not in check
+    '''
+    def getBitboardCastleMoves(self, kingSq, us, them, occupied, moves):
+        if us == "w":
+            home, kingside, queenside = 60, self.currentCastle.wks, self.currentCastle.wqs
+        else:
+            home, kingside, queenside = 4, self.currentCastle.bks, self.currentCastle.bqs
+        if kingSq != home:
+            return
+        rooks = self.bitboards[us + 'R']
+        if kingside and (rooks >> (home + 3)) & 1 and not occupied & (0b11 << (home + 1)):
+            if not self.attackersTo(home + 1, them, occupied) and not self.attackersTo(home + 2, them, occupied):
+                moves.append(ChessEngine.packedMove(home | (home + 2) << 6 | ChessEngine.PACKED_CASTLE, self.board))
+        if queenside and (rooks >> (home - 4)) & 1 and not occupied & (0b111 << (home - 3)):
+            if not self.attackersTo(home - 1, them, occupied) and not self.attackersTo(home - 2, them, occupied):
+                moves.append(ChessEngine.packedMove(home | (home - 2) << 6 | ChessEngine.PACKED_CASTLE, self.board))
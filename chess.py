@@ -4,6 +4,7 @@ Driver file: interacts with user input and game state changes
 
 import pygame as p
 import ChessEngine, chessAI
+from multiprocessing import Process, Queue
 
 
 p.init() #initialize pygame
@@ -41,6 +42,9 @@ def main():
     sqSelected = () #(row,col) of users last click
     sqsClicked = [] #keeps track of player clicks [(row,col),(row,col)]
     gameEnd = False
+    aiThinking = False #flag variable for when the AI is searching in the background
+    moveFinderProcess = None #background process searching for the AI move
+    returnQueue = None #queue the background process puts its move on
     #if human is playing true, else false
     global playerOne, playerTwo, playerColor  
     
@@ -61,6 +65,9 @@ def main():
         for e in p.event.get():
             if e.type == p.QUIT: #check if user wants to quit
                 running = False
+                if aiThinking: #stop the background search
+                    stopMoveFinder(moveFinderProcess)
+                    aiThinking = False
             #mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not gameEnd and playerTurn:
@@ -89,12 +96,18 @@ def main():
             #key handler
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_u: #undo when key 'u' is pressed
+                    if aiThinking: #cancel the AI search, its position is about to change
+                        stopMoveFinder(moveFinderProcess)
+                        aiThinking = False
                     gs.undoMove() #undo move
                     #set flags
                     moveMade = True
                     canAnimate = False
                     gameEnd = False
                 if e.key == p.K_r: #reset board when 'r' is pressed
+                    if aiThinking: #cancel the AI search
+                        stopMoveFinder(moveFinderProcess)
+                        aiThinking = False
                     gs = ChessEngine.GameState() #reinitialize game state
                     validMoves = gs.validMoves() #reinitialize valid moves
                     #reset flags and lists
@@ -106,13 +119,25 @@ def main():
         
         #artifical intelligence move logic
         if not gameEnd and not playerTurn:
-            move = chessAI.bestMove(gs, validMoves) #use NegaMax algorithm to make move
-            if move is None: #check if there is a move
-                move = chessAI.makeRandomMove(validMoves) #make random move
-            gs.makeMove(move) #make move
-            #set flags
-            moveMade = True
-            canAnimate = True
+            bookMove = chessAI.bookMove(gs, validMoves) if not aiThinking else None
+            if bookMove is not None: #still in the opening book, no search needed
+                gs.makeMove(bookMove)
+                moveMade = True
+                canAnimate = True
+            elif not aiThinking: #start searching in a separate process so the window keeps running
+                aiThinking = True
+                returnQueue = Queue()
+                moveFinderProcess = Process(target = chessAI.findMoveInBackground,
+                                            args = (gs, validMoves, chessAI.TIME_LIMIT, returnQueue))
+                moveFinderProcess.start()
+            elif not returnQueue.empty(): #search is done
+                move = returnQueue.get()
+                moveFinderProcess.join()
+                aiThinking = False
+                gs.makeMove(validMoves[validMoves.index(move)]) #make move (the process sent back a copy)
+                #set flags
+                moveMade = True
+                canAnimate = True
                   
         if moveMade:
             if canAnimate:
@@ -133,11 +158,23 @@ def main():
         elif gs.staleMate: #check if game ended in stalemate
             gameEnd = True
             drawEndText(screen, 'Stalemate') #display end text
+        elif gs.isDraw(): #threefold repetition or fifty-move rule
+            gameEnd = True
+            drawEndText(screen, 'Draw') #display end text
             
         clock.tick(MAX_FPS)
         p.display.flip()
 
 
+'''
+Stop a background AI search that is no longer needed
+'''
+def stopMoveFinder(moveFinderProcess):
+    if moveFinderProcess.is_alive():
+        moveFinderProcess.terminate()
+    moveFinderProcess.join()
+
+
 '''
 Resposible for all graphics within a current game state
 '''
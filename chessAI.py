@@ -1,79 +1,66 @@
+import multiprocessing
 import random
+import time
+import ChessEngine
+import transposition
+import moveOrdering
+from evaluation import piecePoints, positionScores, pointMultiplier
 '''
 Note for algorithms: A positive score is always good for white and a negative score is always good for black
 '''
-#point values of each piece type
-piecePoints = {"K": 0, "Q": 9, "R": 5, "N": 3, "B": 3, "p": 1}
-
-#2D list of piece scores used to calculate best moves based on position (higher value = better position for piece)
-#knight: knights are better off in the center of the board
-knightScore = [[1,1,1,1,1,1,1,1],  
-               [1,2,2,2,2,2,2,1],
-               [1,2,3,3,3,3,2,1],
-               [1,2,3,4,4,3,2,1],
-               [1,2,3,4,4,3,2,1],
-               [1,2,3,3,3,3,2,1],
-               [1,2,2,2,2,2,2,1],
-               [1,1,1,1,1,1,1,1]]
-
-#bishop: bishops are better off on long diagonals
-bishopScore = [[4,3,2,1,1,2,3,4],  
-               [3,4,3,2,2,3,4,3],
-               [2,3,4,3,3,4,3,2],
-               [1,2,3,4,4,3,2,1],
-               [1,2,3,4,4,3,2,1],
-               [2,3,4,3,3,4,3,2],
-               [3,4,3,2,2,3,4,3],
-               [4,3,2,1,1,2,3,4]]
-
-#queen: queens are better off on central files or squares close to king
-queenScore =  [[1,1,1,3,1,1,1,1],  
-               [1,2,3,3,3,1,1,1],
-               [1,4,3,3,3,4,2,1],
-               [1,2,3,3,3,2,2,1],
-               [1,2,3,3,3,2,2,1],
-               [1,4,3,3,3,4,2,1],
-               [1,1,2,3,3,1,1,1],
-               [1,1,1,3,1,1,1,1]]
-
-#rook: rooks are better off on back rows or central files
-rookScore =   [[4,3,4,4,4,4,3,4],  
-               [4,4,4,4,4,4,4,4],
-               [1,1,2,3,3,2,1,1],
-               [1,2,3,4,4,3,2,1],
-               [1,2,3,4,4,3,2,1],
-               [1,1,2,2,2,2,1,1],
-               [4,4,4,4,4,4,4,4],
-               [4,3,4,4,4,4,3,4]]
-
-#white pawn: white pawns are best off on the opposite side(for promotion) or in the center
-whitePawnScore = [[9,9,9,9,9,9,9,9],  
-                  [9,9,9,9,9,9,9,9],
-                  [5,6,6,7,7,6,6,5],
-                  [2,3,3,5,5,3,3,2],
-                  [1,2,3,4,4,3,2,1],
-                  [1,1,2,3,3,2,1,1],
-                  [1,1,1,0,0,1,1,1],
-                  [0,0,0,0,0,0,0,0]]
-
-#black pawn: black pawns are best off on the opposite side(for promotion) or in the center
-blackPawnScore = [[0,0,0,0,0,0,0,0],  
-                  [1,1,1,0,0,1,1,1],
-                  [1,1,2,3,3,2,1,1],
-                  [1,2,3,4,4,3,2,1],
-                  [2,3,3,5,5,3,3,2],
-                  [5,6,6,7,7,6,6,5],
-                  [9,9,9,9,9,9,9,9],
-                  [9,9,9,9,9,9,9,9]]
-
-#dictionary to store pieces and their scores
-positionScores = {"N": knightScore, "B": bishopScore, "Q": queenScore,
-                  "R": rookScore, "wp": whitePawnScore, "bp": blackPawnScore}
-pointMultiplier = 0.1 #multiplier to bring down point weight to reasonable value
-
-CHECKMATE = 1000 #highest possible score
+CHECKMATE = 1000 #highest possible score, being mated ply plies from the root scores -CHECKMATE + ply * 0.1
 STALEMATE = 0
 DEPTH = 3 #how many moves ahead the AI will think (higher = slower response time)
+TIME_LIMIT = 2.0 #seconds the AI may think per move when searching with iterative deepening
+MAX_DEPTH = 32 #deepest iteration iterative deepening will start
+TT_SIZE_MB = 16 #memory budget of the transposition table in megabytes
+EVAL_DEBUG = False #when True, scoreBoard checks the incremental score against a full board scan
+DELTA_MARGIN = 2 #quiescence skips captures that leave the score this far (in points) below alpha
+NULL_WINDOW = 0.05 #width of the windows that only test a move against alpha, below the smallest score step (0.1)
+ASPIRATION_WINDOW = 0.5 #points each side of the last iteration's score the next iteration searches first
+NULL_MOVE_REDUCTION = 2 #how much shallower than a normal move the null move is searched
+NULL_MOVE_MIN_DEPTH = 3 #remaining depth from which null move pruning is tried
+LMR_MIN_DEPTH = 3 #remaining depth from which late quiet moves are searched one ply shallower
+LMR_MIN_MOVES = 3 #moves searched at full depth before reductions start
+STOP_POLL_INTERVAL = 0.05 #seconds between checks for stop() and the deadline while waiting for parallel workers
+BOOK_PATH = "book.bin" #opening book made by openingBook.py, played from by the move wrappers while the game is in it
+TABLEBASE_PATH = "tablebases" #endgame tables made by tablebase.py, probed by the search once few enough pieces are left
+TABLEBASE_WIN = 500 #score of a tablebase win, less 0.1 per ply to mate: above any material score, below CHECKMATE
+MATE_BOUND = CHECKMATE - moveOrdering.MAX_PLY * 0.1 #scores at least this far from 0 are mates
+#scores at least this far from 0 are mates or tablebase wins and losses, counted in plies from the root (the
+#longest table mate is 127 plies): the transposition table keeps them counted from the node instead
+TABLEBASE_BOUND = TABLEBASE_WIN - (127 + moveOrdering.MAX_PLY) * 0.1
+
+#positions already searched and killer/history tables used by bestMove and bestMoveTimed, kept between
+#their searches (resize the table with transpositionTable.resize(MB)). A Searcher can be given its own
+transpositionTable = transposition.TranspositionTable(TT_SIZE_MB)
+ordering = moveOrdering.MoveOrdering()
+book = None #openingBook.OpeningBook of BOOK_PATH, opened on first use (False when there is no book)
+tablebases = None #tablebase.Tablebases of TABLEBASE_PATH, opened on first use
+
+'''
+Raised inside the search when the time or node budget runs out
+'''
+class SearchTimeout(Exception):
+    pass
+
+'''
+What a search found: the move to play and its score (positive is good for the side to move), the
+principal variation (the line both sides are expected to play, starting with move), the number of
+nodes searched, seconds taken and the deepest iteration that finished
+'''
+class SearchResult():
+    def __init__(self, move = None, score = 0, pv = None, nodes = 0, elapsed = 0.0, depth = 0):
+        self.move = move
+        self.score = score
+        self.pv = pv if pv is not None else []
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.depth = depth
+
+    def __str__(self):
+        return "depth %d score %.2f nodes %d time %.2fs pv %s" % (self.depth, self.score, self.nodes, self.elapsed,
+                                                                " ".join(str(move) for move in self.pv))
 
 '''
 Find a random valid move
@@ -123,99 +110,561 @@ def makeBestMove(gs, validMoves):
     
 
 '''
-Helper method for first recursive call
+A move from the opening book for gs, or None when there is no book or the position isn't in it
 '''
-def bestMove(gs, validMoves):
-    global nextMove
-    nextMove = None
-    moveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteMove else -1) #search for best move
-    return nextMove #return best move
+def bookMove(gs, validMoves):
+    global book
+    if book is None:
+        import openingBook #only needed when there is a book
+        try:
+            book = openingBook.OpeningBook(BOOK_PATH)
+        except (OSError, ValueError):
+            book = False
+    return book.pickMove(gs, validMoves) if book else None
 
+'''
+The endgame tables of TABLEBASE_PATH (a directory without tables gives a Tablebases that covers nothing)
+'''
+def getTablebases():
+    global tablebases
+    if tablebases is None:
+        import tablebase
+        tablebases = tablebase.Tablebases(TABLEBASE_PATH)
+    return tablebases
 
 '''
-Recursive MinMax algorithm to find best move
+Search score of a tablebase value (see tablebase.py: 0 draw, 1 to 127 win in that many plies, 128 + n mated in n
+plies) for the side to move of a position ply plies from the root: mates nearer the root score higher, and so do
+losses further away
 '''
-#third algorithm tried: same as second algorithm except this time it's recursive and can go to more depth
-def moveMinMax(gs, validMoves, depth, whiteMove):
-    global nextMove
-    if depth == 0:
-        return boardScore(gs.board)
-    
-    #maximize score
-    if whiteMove:
-        maxScore = -CHECKMATE #start at lowest score possible
-        for move in validMoves:
+def tablebaseScore(value, ply):
+    if value == 0: #draw
+        return STALEMATE
+    if value >= 128: #loss, mated in value - 128 plies
+        return -TABLEBASE_WIN + (ply + value - 128) * 0.1
+    return TABLEBASE_WIN - (ply + value) * 0.1
+
+'''
+Plies to mate of a search score for the side to move (a mate it gives or, for negative scores, gets), or None if
+the score is not a mate or tablebase result
+'''
+def matePlies(score):
+    if abs(score) >= MATE_BOUND:
+        return int(round((CHECKMATE - abs(score)) * 10))
+    if abs(score) >= TABLEBASE_BOUND:
+        return int(round((TABLEBASE_WIN - abs(score)) * 10))
+    return None
+
+'''
+Score to store in the transposition table for a node ply plies from the root: wins and losses counted from the
+node, so the entry is right wherever the position turns up again
+'''
+def scoreToTable(score, ply):
+    if score >= TABLEBASE_BOUND:
+        return score + ply * 0.1
+    if score <= -TABLEBASE_BOUND:
+        return score - ply * 0.1
+    return score
+
+'''
+Search score of a transposition table score found ply plies from the root (the inverse of scoreToTable)
+'''
+def scoreFromTable(score, ply):
+    if score >= TABLEBASE_BOUND:
+        return score - ply * 0.1
+    if score <= -TABLEBASE_BOUND:
+        return score + ply * 0.1
+    return score
+
+
+'''
+Helper method for first recursive call (workers > 1 splits the root moves over that many processes)
+'''
+def bestMove(gs, validMoves, workers = 1):
+    move = bookMove(gs, validMoves)
+    if move is not None:
+        return move
+    searcher = Searcher(DEPTH, transpositionTable = transpositionTable, ordering = ordering, workers = workers)
+    return searcher.search(gs, validMoves).move
+
+
+'''
+Iterative deepening: search to depth 1, 2, 3, ... until the time (seconds) or node budget runs out,
+and return the best move of the deepest search that finished
+'''
+def bestMoveTimed(gs, validMoves, timeLimit = TIME_LIMIT, maxNodes = None, maxDepth = MAX_DEPTH):
+    move = bookMove(gs, validMoves)
+    if move is not None:
+        return move
+    searcher = Searcher(maxDepth, timeLimit, maxNodes, transpositionTable = transpositionTable, ordering = ordering)
+    return searcher.search(gs, validMoves).move
+
+
+'''
+Entry point of the background search process started by chess.py: searches its own copy of the
+game state and puts the chosen move on returnQueue
+'''
+def findMoveInBackground(gs, validMoves, timeLimit, returnQueue):
+    move = bestMoveTimed(gs, validMoves, timeLimit)
+    if move is None: #check if there is a move
+        move = makeRandomMove(validMoves)
+    returnQueue.put(move)
+
+
+workerPool = None #process pool used by Searcher.searchParallel, kept between searches
+workerCount = 0
+sharedAlpha = None #multiprocessing.Value holding the best root score found so far
+sharedNodes = None #multiprocessing.Value counting the nodes of the running parallel search, for its node limit
+workerSearcher = None #Searcher of a pool process, keeps its tables between tasks
+
+'''
+Returns the process pool for the given number of workers and the shared alpha and node count values, creating
+them if needed
+'''
+def getWorkerPool(workers):
+    global workerPool, workerCount, sharedAlpha, sharedNodes
+    if workerPool is None or workerCount != workers:
+        closeWorkerPool()
+        sharedAlpha = multiprocessing.Value('d', -CHECKMATE) #a double in shared memory
+        sharedNodes = multiprocessing.Value('q', 0)
+        workerPool = multiprocessing.Pool(workers, initializer = initWorker, initargs = (sharedAlpha, sharedNodes))
+        workerCount = workers
+    return workerPool, sharedAlpha, sharedNodes
+
+'''
+Shut down the parallel search processes
+'''
+def closeWorkerPool():
+    global workerPool, workerCount
+    if workerPool is not None:
+        workerPool.terminate()
+        workerPool.join()
+        workerPool = None
+        workerCount = 0
+
+'''
+Runs once in every pool process: shared memory can only be handed over when the process starts
+'''
+def initWorker(alpha, nodes):
+    global sharedAlpha, sharedNodes, workerSearcher
+    sharedAlpha = alpha
+    sharedNodes = nodes
+    workerSearcher = Searcher(transpositionTable = transpositionTable, ordering = ordering)
+
+'''
+Search one root move in a pool process, with alpha read from shared memory at the start; a better score
+is written back for the other workers. deadline is a time.time() value (None for no limit), maxNodes the node
+limit of the whole search, shared with the other workers. Returns (score, alpha used, nodes searched), the
+score is None when the limits ran out before the move was searched
+'''
+def searchRootMove(task):
+    gs, move, depth, scoreSelector, deadline, maxNodes = task
+    searcher = workerSearcher
+    searcher.rootDepth = depth #the root itself is searched by Searcher.searchParallel
+    searcher.nodes = 0
+    searcher.nullMovePlies = []
+    #perf_counter values differ between processes, the wall clock doesn't
+    searcher.deadline = time.perf_counter() + deadline - time.time() if deadline is not None else float('inf')
+    searcher.nodeLimit = maxNodes - sharedNodes.value if maxNodes is not None else float('inf')
+    alpha = sharedAlpha.value
+    gs.makeMove(move) #gs is this task's own copy, an interrupted search can leave moves on it
+    try:
+        score = -searcher.negaMax(gs, None, depth - 1, -CHECKMATE, -alpha, -scoreSelector, 1)
+    except SearchTimeout:
+        score = None
+    with sharedNodes.get_lock():
+        sharedNodes.value += searcher.nodes
+    if score is not None:
+        with sharedAlpha.get_lock():
+            if score > sharedAlpha.value:
+                sharedAlpha.value = score
+    return score, alpha, searcher.nodes
+
+
+'''
+Alpha beta search with everything it needs kept on the object (limits, transposition table, killer and
+history tables, node count), so any number of searches can run side by side in one process
+'''
+class Searcher():
+    '''
+    depth: deepest iteration, timeLimit: seconds, maxNodes: nodes (None for no limit), workers > 1 splits
+    the root moves over that many processes. transpositionTable and ordering can be shared with other searchers.
+    nullMove and lateMoveReductions turn the two pruning techniques on or off, to compare against the plain search.
+    tablebases (default: the tables of TABLEBASE_PATH) are probed once few enough pieces are left
+    '''
+    def __init__(self, depth = DEPTH, timeLimit = None, maxNodes = None, transpositionTable = None,
+                 ordering = None, workers = 1, nullMove = True, lateMoveReductions = True, tablebases = None):
+        self.depth = depth
+        self.timeLimit = timeLimit
+        self.maxNodes = maxNodes
+        self.workers = workers
+        self.nullMove = nullMove
+        self.lateMoveReductions = lateMoveReductions
+        self.transpositionTable = transpositionTable if transpositionTable is not None else \
+                                  transposition.TranspositionTable(TT_SIZE_MB)
+        self.ordering = ordering if ordering is not None else moveOrdering.MoveOrdering()
+        self.tablebases = tablebases if tablebases is not None else getTablebases()
+        self.deadline = float('inf') #time.perf_counter() value at which the search has to stop
+        self.nodeLimit = float('inf') #number of nodes after which the search has to stop
+        self.nodes = 0
+        self.rootDepth = 0 #depth of the running iteration
+        self.rootMove = None #best move found so far by the running iteration
+        self.stopped = False #set by stop() from another thread, cleared by the caller before the next search
+        self.onIteration = None #called with a SearchResult after every finished iteration
+        #triangular PV table: pvTable[ply] is the best line found from the node at ply, built from the line below it
+        self.pvTable = [[] for _ in range(moveOrdering.MAX_PLY + 1)]
+        self.previousPV = [] #move IDs of the last finished iteration's PV, searched first by the next one
+        self.followPV = False #True while the search is still going down the previous PV
+        self.nullMovePlies = [] #len(gs.moveLog) at every null move on the board, to take them back after a timeout
+
+    '''
+    Reset the counters and limits and age the tables, called at the start of every search
+    '''
+    def startSearch(self):
+        self.deadline = time.perf_counter() + self.timeLimit if self.timeLimit is not None else float('inf')
+        self.nodeLimit = self.maxNodes if self.maxNodes is not None else float('inf')
+        self.nodes = 0
+        self.previousPV = []
+        self.followPV = False
+        self.nullMovePlies = []
+        self.transpositionTable.newSearch()
+        self.ordering.newSearch()
+
+    '''
+    End the running search as soon as possible (safe to call from another thread), it returns the best move so far
+    '''
+    def stop(self):
+        self.stopped = True
+
+    '''
+    Find the best move for the side to move in gs. With a time or node limit this is iterative deepening:
+    search to depth 1, 2, 3, ... until self.depth or the budget runs out. Returns a SearchResult
+    '''
+    def search(self, gs, validMoves = None):
+        start = time.perf_counter()
+        self.startSearch()
+        validMoves = list(validMoves if validMoves is not None else gs.validMoves()) #reordered below
+        result = SearchResult(validMoves[0] if validMoves else None)
+        if len(validMoves) == 0 or (len(validMoves) == 1 and self.timeLimit is not None): #nothing to think about
+            result.pv = validMoves[:]
+            return result
+        if gs.pieceCount <= self.tablebases.maxPieces: #the tables know the best move, no search needed
+            best = self.tablebases.bestMove(gs, validMoves)
+            if best is not None:
+                return SearchResult(best[0], tablebaseScore(best[1], 0), [best[0]], self.nodes,
+                                    time.perf_counter() - start, 1)
+        if self.workers > 1:
+            return self.searchParallel(gs, validMoves, start)
+
+        moveLogLength = len(gs.moveLog)
+        scoreSelector = 1 if gs.whiteMove else -1
+        #go straight to full depth unless the search may be cut short or someone wants to hear about every iteration
+        iterative = self.timeLimit is not None or self.maxNodes is not None or self.onIteration is not None
+        for depth in range(1 if iterative else self.depth, self.depth + 1):
+            self.rootDepth = depth
+            #aspiration window: expect about the last iteration's score, a narrow window cuts off more
+            if result.depth > 0 and abs(result.score) < MATE_BOUND:
+                alpha, beta = result.score - ASPIRATION_WINDOW, result.score + ASPIRATION_WINDOW
+            else:
+                alpha, beta = -CHECKMATE, CHECKMATE
+            try:
+                while True:
+                    self.rootMove = None
+                    self.followPV = True
+                    score = self.negaMax(gs, validMoves, depth, alpha, beta, scoreSelector, 0)
+                    if score <= alpha and alpha > -CHECKMATE: #failed low, the score is only an upper bound
+                        alpha = -CHECKMATE
+                    elif score >= beta and beta < CHECKMATE: #failed high, only a lower bound
+                        beta = CHECKMATE
+                    else:
+                        break
+            except SearchTimeout:
+                self.takeBack(gs, moveLogLength)
+                if result.depth == 0 and self.rootMove is not None: #not even depth 1 finished, use the best move seen so far
+                    result.move = self.rootMove
+                break
+            if self.rootMove is not None:
+                result.move = self.rootMove
+                validMoves.insert(0, validMoves.pop(validMoves.index(self.rootMove))) #search it first next iteration
+            result.score = score
+            result.depth = depth
+            result.pv = self.pvTable[0][:]
+            if not result.pv or result.pv[0] != result.move: #root score came from the transposition table
+                result.pv = self.principalVariation(gs, result.move, depth)
+            self.previousPV = [move.moveID for move in result.pv]
+            if self.onIteration is not None:
+                self.onIteration(SearchResult(result.move, score, result.pv, self.nodes, time.perf_counter() - start, depth))
+            if abs(score) >= MATE_BOUND: #forced mate found, deeper searches won't change the move
+                break
+        if result.depth == 0: #interrupted in the first iteration
+            result.pv = [result.move]
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    '''
+    Take back the moves (and null moves) an interrupted search left on gs, down to moveLogLength logged moves
+    '''
+    def takeBack(self, gs, moveLogLength):
+        nullMovePlies = self.nullMovePlies
+        while len(gs.moveLog) > moveLogLength or nullMovePlies:
+            if nullMovePlies and nullMovePlies[-1] == len(gs.moveLog):
+                nullMovePlies.pop()
+                gs.undoNullMove()
+            else:
+                gs.undoMove()
+
+    '''
+    Root split search to self.depth: the first (best ordered) root move is searched here to get an alpha bound,
+    then the other root moves are searched in parallel by a pool of processes that share alpha through shared memory.
+    With a time or node limit this deepens one root split at a time like search does. The workers get the limits
+    too; when they run out (or stop() is called) the result is the one of the last depth that finished
+    '''
+    def searchParallel(self, gs, validMoves, start):
+        scoreSelector = 1 if gs.whiteMove else -1
+        entry = self.transpositionTable.probe(gs.zobristKey)
+        self.ordering.orderMoves(validMoves, 0, entry[3] if entry is not None else 0)
+        result = SearchResult(validMoves[0])
+        iterative = self.timeLimit is not None or self.maxNodes is not None or self.onIteration is not None
+        for depth in range(1 if iterative else self.depth, self.depth + 1):
+            self.rootDepth = depth
+            move, score, complete = self.searchRootSplit(gs, validMoves, depth, scoreSelector)
+            if not complete:
+                if result.depth == 0 and move is not None: #not even one depth finished, use the best move seen so far
+                    result.move = move
+                break
+            result.move, result.score, result.depth = move, score, depth
+            validMoves.insert(0, validMoves.pop(validMoves.index(move))) #search it first next depth
+            if self.onIteration is not None:
+                self.onIteration(SearchResult(move, score, [move], self.nodes, time.perf_counter() - start, depth))
+            if abs(score) >= MATE_BOUND:
+                break
+        result.pv = [result.move]
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    '''
+    One root split search to depth, see searchParallel. Returns (best move, its score, whether every root move
+    was searched); the move is None when not even the first one finished
+    '''
+    def searchRootSplit(self, gs, validMoves, depth, scoreSelector):
+        #young brothers wait: search the first move alone so every worker starts with a real alpha
+        bestMove = validMoves[0]
+        moveLogLength = len(gs.moveLog)
+        gs.makeMove(bestMove)
+        try:
+            bestScore = -self.negaMax(gs, None, depth - 1, -CHECKMATE, CHECKMATE, -scoreSelector, 1)
+        except SearchTimeout:
+            self.takeBack(gs, moveLogLength)
+            return None, 0, False
+        gs.undoMove()
+
+        pool, alpha, nodes = getWorkerPool(self.workers)
+        alpha.value = bestScore
+        nodes.value = self.nodes
+        deadline = time.time() + self.deadline - time.perf_counter() if self.deadline != float('inf') else None
+        tasks = [(gs, move, depth, scoreSelector, deadline, self.maxNodes) for move in validMoves[1:]]
+        results = pool.imap(searchRootMove, tasks)
+        complete = True
+        for move in validMoves[1:]:
+            #wait in short steps, so stop() from another thread is seen; the pool is shut down to end the search
+            while True:
+                try:
+                    score, alphaUsed, moveNodes = results.next(STOP_POLL_INTERVAL)
+                    break
+                except multiprocessing.TimeoutError:
+                    if self.stopped or time.perf_counter() >= self.deadline + STOP_POLL_INTERVAL:
+                        closeWorkerPool()
+                        return bestMove, bestScore, False
+            self.nodes += moveNodes
+            if score is None: #ran out of time or nodes before this move was searched
+                complete = False
+            #a score at or below the alpha the worker started with is only an upper bound, it can't be the best
+            elif score > alphaUsed and score > bestScore:
+                bestScore = score
+                bestMove = move
+        return bestMove, bestScore, complete
+
+    '''
+    Nega Max algorithm to find best move with Alpha Beta Pruning
+    '''
+    #fifth algorithm tried (BEST): same as fourth algorithm except I added alpha beta pruning to speed up the process of searching for moves
+    def negaMax(self, gs, validMoves, depth, alpha, beta, scoreSelector, ply):
+        #beta: highest possible score, alpha: lowest possible score, ply: moves made since the root
+        #validMoves: the legal moves, or None to have them generated stage by stage as the search needs them
+        self.nodes += 1
+        if self.nodes > self.nodeLimit or self.stopped or time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        pvTable = self.pvTable
+        pvTable[ply] = [] #nodes cut off early have no line
+        #a position seen before in the game or search is scored as a draw, if it is good one side can repeat it again
+        #(it takes at least 4 plies without a capture or pawn move to come back to a position). The fifty-move rule
+        #doesn't save a side that is checkmated on the hundredth ply
+        if ply != 0 and gs.halfmoveClock >= 4:
+            if gs.repetitions(1):
+                return STALEMATE
+            if gs.halfmoveClock >= ChessEngine.FIFTY_MOVE_PLIES:
+                if gs.kingInCheck() and len(gs.validMoves()) == 0:
+                    return -CHECKMATE + ply * 0.1
+                return STALEMATE
+        if ply != 0 and gs.pieceCount <= self.tablebases.maxPieces: #exact result from the endgame tables
+            value = self.tablebases.probe(gs)
+            if value is not None:
+                return tablebaseScore(value, ply)
+        if depth == 0: #settle the captures before scoring, so a half finished exchange isn't scored
+            return self.quiescence(gs, alpha, beta, scoreSelector, ply)
+
+        #look the position up in the transposition table
+        alphaOriginal = alpha
+        hashMove = 0
+        entry = self.transpositionTable.probe(gs.zobristKey)
+        if entry is not None:
+            entryScore, entryDepth, entryBound, hashMove = entry
+            entryScore = scoreFromTable(entryScore, ply)
+            if entryDepth >= depth and ply != 0: #root always searches so the best move gets set
+                if entryBound == transposition.EXACT:
+                    return entryScore
+                elif entryBound == transposition.LOWERBOUND:
+                    alpha = max(alpha, entryScore)
+                else:
+                    beta = min(beta, entryScore)
+                if alpha >= beta:
+                    return entryScore
+
+        #null move pruning: let the opponent move twice in a row. If a shallow search still fails high, a real move
+        #would too. Only in null window nodes, not in check, not right after another null move, and not when the
+        #side to move has only pawns, where passing could be its best option (zugzwang)
+        nullMovePlies = self.nullMovePlies
+        if self.nullMove and ply != 0 and depth >= NULL_MOVE_MIN_DEPTH and beta - alpha < 2 * NULL_WINDOW and \
+                abs(beta) < MATE_BOUND and (not nullMovePlies or nullMovePlies[-1] != len(gs.moveLog)) and \
+                scoreSelector * scoreBoard(gs) >= beta and gs.hasPieces("w" if gs.whiteMove else "b") and \
+                not gs.kingInCheck():
+            nullMovePlies.append(len(gs.moveLog))
+            gs.makeNullMove()
+            nullDepth = depth - 1 - NULL_MOVE_REDUCTION
+            score = -self.negaMax(gs, None, nullDepth, -beta, -beta + NULL_WINDOW, -scoreSelector, ply + 1)
+            gs.undoNullMove()
+            nullMovePlies.pop()
+            if score >= beta:
+                return score if score < MATE_BOUND else beta #a mate found after passing proves nothing
+
+        #on the previous iteration's PV its move goes first, else the hash move, captures, killers, then quiet moves by history
+        if self.followPV and ply < len(self.previousPV):
+            hashMove = self.previousPV[ply]
+
+        #late move reductions: quiet moves ordered late rarely turn out best, search them shallower first. Not at the
+        #root, and only when a hash move or an earlier iteration ordered the moves, else "late" means nothing
+        reduce = self.lateMoveReductions and ply != 0 and depth >= LMR_MIN_DEPTH and \
+                 (hashMove != 0 or len(self.previousPV) != 0) and not gs.kingInCheck()
+        if validMoves is not None: #a list from the caller (the root), sort it in place
+            self.ordering.orderMoves(validMoves, ply, hashMove)
+            moves = validMoves
+        else:
+            moves = self.ordering.pickMoves(gs, ply, hashMove)
+
+        maxScore = -CHECKMATE
+        bestMoveID = 0
+        i = -1
+        for i, move in enumerate(moves):
             gs.makeMove(move)
-            nextMoves = gs.validMoves()
-            score = moveMinMax(gs, nextMoves, depth - 1, False) #pass next move (recursive call)
+            if i == 0: #principal variation search: the first move is expected to be best, search it with the full window
+                score = -self.negaMax(gs, None, depth - 1, -beta, -alpha, -scoreSelector, ply + 1) #switch to opponent
+                self.followPV = False #only the first move of each node on the PV continues it
+            else: #the others only have to be shown to be no better than alpha, which a null window does cheaply
+                reduction = 1 if reduce and i >= LMR_MIN_MOVES and not move.isCapture and not move.pawnPromotion \
+                                 and not gs.kingInCheck() else 0 #no reduction for moves that give check
+                score = -self.negaMax(gs, None, depth - 1 - reduction, -alpha - NULL_WINDOW, -alpha,
+                                      -scoreSelector, ply + 1)
+                if reduction and score > alpha: #the reduced search says it may be better, check at full depth
+                    score = -self.negaMax(gs, None, depth - 1, -alpha - NULL_WINDOW, -alpha, -scoreSelector, ply + 1)
+                if alpha < score < beta: #it is better after all, get its real score
+                    score = -self.negaMax(gs, None, depth - 1, -beta, -alpha, -scoreSelector, ply + 1)
             if score > maxScore:
                 maxScore = score
-                if depth == DEPTH: #searched all possible moves for depth = 2
-                    nextMove = move 
+                bestMoveID = move.moveID
+                if ply == 0:
+                    self.rootMove = move
             gs.undoMove()
+            if maxScore > alpha: #pruning
+                alpha = maxScore
+                pvTable[ply] = [move] + pvTable[ply + 1]
+            if alpha >= beta: #already found good max score
+                self.ordering.recordCutoff(move, ply, depth)
+                break
+        if i < 0: #no legal move: checkmate or stalemate
+            return -CHECKMATE + ply * 0.1 if gs.kingInCheck() else STALEMATE #quicker mates score higher
+
+        #remember the result, and whether it is exact or only a bound
+        if maxScore <= alphaOriginal:
+            bound = transposition.UPPERBOUND
+        elif maxScore >= beta:
+            bound = transposition.LOWERBOUND
+        else:
+            bound = transposition.EXACT
+        self.transpositionTable.store(gs.zobristKey, scoreToTable(maxScore, ply), depth, bound, bestMoveID)
         return maxScore
-            
-    #minimize score
-    else:
-        minScore = CHECKMATE #start at highest score possible
-        for move in validMoves:
+
+    '''
+    Quiescence search: past the nominal depth keep searching captures and promotions until the position is
+    quiet. The side to move may also stand pat (take the static score) since it doesn't have to capture
+    '''
+    def quiescence(self, gs, alpha, beta, scoreSelector, ply):
+        self.nodes += 1
+        if self.nodes > self.nodeLimit or self.stopped or time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        moves = gs.captureMoves() #every evasion when in check, so mate is still seen
+        if gs.checkMate:
+            return -CHECKMATE + ply * 0.1
+        inCheck = gs.inCheck #children overwrite gs.inCheck
+        if not inCheck: #in check there is no standing pat, the check has to be answered
+            standPat = scoreSelector * scoreBoard(gs)
+            if standPat >= beta:
+                return standPat
+            if standPat > alpha:
+                alpha = standPat
+        maxScore = alpha if not inCheck else -CHECKMATE
+        self.ordering.orderMoves(moves, ply)
+        for move in moves:
+            #delta pruning: skip captures that can't bring the score back up to alpha even with a margin
+            if not inCheck and not move.pawnPromotion and \
+                    standPat + piecePoints[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+                continue
             gs.makeMove(move)
-            nextMoves = gs.validMoves()
-            score = moveMinMax(gs, nextMoves, depth - 1, True) #pass next move (recursive call)
-            if score < minScore:
-                minScore = score
-                if depth == DEPTH: #searched all possible moves for depth = 2
-                    nextMove = move
+            score = -self.quiescence(gs, -beta, -alpha, -scoreSelector, ply + 1)
             gs.undoMove()
-        return minScore
-    
-
-'''
-Nega Max algorithm to find best move
-'''
-#fourth algorithm tried: calculate best move based on position rather than material (NegaMax algorithm)
-def moveNegaMax(gs, validMoves, depth, scoreSelector):
-    global nextMove
-    if depth == 0:
-        return scoreSelector * scoreBoard(gs)
-    maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.makeMove(move)
-        nextMoves = gs.validMoves()
-        score = -moveNegaMax(gs, nextMoves, depth - 1, -scoreSelector)
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
-        gs.undoMove()
-    return maxScore
-
+            if score > maxScore:
+                maxScore = score
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    break
+        return maxScore
 
-'''
-Nega Max algorithm to find best move with Alpha Beta Pruning
-'''
-#fifth algorithm tried (BEST): same as fourth algorithm except I added alpha beta pruning to speed up the process of searching for moves
-def moveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, scoreSelector):
-    #beta: highest possible score, alpha: lowest possible score
-    global nextMove
-    if depth == 0:
-        return scoreSelector * scoreBoard(gs)
-    
-    maxScore = -CHECKMATE
-    for move in validMoves:
+    '''
+    The expected line starting with move: after it, follow the best moves stored in the transposition table
+    '''
+    def principalVariation(self, gs, move, depth):
+        if move is None:
+            return []
+        pv = [move]
         gs.makeMove(move)
-        nextMoves = gs.validMoves()
-        score = -moveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -scoreSelector) #switch to opponent
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
-        gs.undoMove()
-        if maxScore > alpha: #pruning
-            alpha = maxScore
-        if alpha >= beta: #already found good max score 
-            break
-    return maxScore
+        while len(pv) < depth:
+            entry = self.transpositionTable.probe(gs.zobristKey)
+            if entry is None or entry[3] == 0:
+                break
+            nextMove = None
+            for validMove in gs.validMoves():
+                if validMove.moveID == entry[3]:
+                    nextMove = validMove
+                    break
+            if nextMove is None: #stored move belongs to another position with the same key
+                break
+            pv.append(nextMove)
+            gs.makeMove(nextMove)
+        for _ in pv:
+            gs.undoMove()
+        return pv
 
 
 '''
@@ -230,7 +679,19 @@ def scoreBoard(gs):
             return CHECKMATE #white wins
     elif gs.staleMate:
         return STALEMATE
-    
+
+    score = gs.score * pointMultiplier #kept up to date by makeMove/undoMove
+    if EVAL_DEBUG:
+        expected = scoreBoardFullScan(gs)
+        if abs(score - expected) > 1e-9:
+            raise AssertionError("incremental score out of sync: " + str(score) + " != " + str(expected))
+    return score
+
+
+'''
+Same score as scoreBoard, calculated by scanning every square (used to check the incremental score)
+'''
+def scoreBoardFullScan(gs):
     score = 0
     for row in range(len(gs.board)):
         for col in range(len(gs.board[row])):
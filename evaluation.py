@@ -0,0 +1,83 @@
+'''
+Static evaluation tables shared by the engine and the AI: piece values and position scores, and the material +
+position score of every piece on every square that GameState keeps its incremental score with
+'''
+#point values of each piece type
+piecePoints = {"K": 0, "Q": 9, "R": 5, "N": 3, "B": 3, "p": 1}
+
+#2D list of piece scores used to calculate best moves based on position (higher value = better position for piece)
+#knight: knights are better off in the center of the board
+knightScore = [[1,1,1,1,1,1,1,1],  
+               [1,2,2,2,2,2,2,1],
+               [1,2,3,3,3,3,2,1],
+               [1,2,3,4,4,3,2,1],
+               [1,2,3,4,4,3,2,1],
+               [1,2,3,3,3,3,2,1],
+               [1,2,2,2,2,2,2,1],
+               [1,1,1,1,1,1,1,1]]
+
+#bishop: bishops are better off on long diagonals
+bishopScore = [[4,3,2,1,1,2,3,4],  
+               [3,4,3,2,2,3,4,3],
+               [2,3,4,3,3,4,3,2],
+               [1,2,3,4,4,3,2,1],
+               [1,2,3,4,4,3,2,1],
+               [2,3,4,3,3,4,3,2],
+               [3,4,3,2,2,3,4,3],
+               [4,3,2,1,1,2,3,4]]
+
+#queen: queens are better off on central files or squares close to king
+queenScore =  [[1,1,1,3,1,1,1,1],  
+               [1,2,3,3,3,1,1,1],
+               [1,4,3,3,3,4,2,1],
+               [1,2,3,3,3,2,2,1],
+               [1,2,3,3,3,2,2,1],
+               [1,4,3,3,3,4,2,1],
+               [1,1,2,3,3,1,1,1],
+               [1,1,1,3,1,1,1,1]]
+
+#rook: rooks are better off on back rows or central files
+rookScore =   [[4,3,4,4,4,4,3,4],  
+               [4,4,4,4,4,4,4,4],
+               [1,1,2,3,3,2,1,1],
+               [1,2,3,4,4,3,2,1],
+               [1,2,3,4,4,3,2,1],
+               [1,1,2,2,2,2,1,1],
+               [4,4,4,4,4,4,4,4],
+               [4,3,4,4,4,4,3,4]]
+
+#white pawn: white pawns are best off on the opposite side(for promotion) or in the center
+whitePawnScore = [[9,9,9,9,9,9,9,9],  
+                  [9,9,9,9,9,9,9,9],
+                  [5,6,6,7,7,6,6,5],
+                  [2,3,3,5,5,3,3,2],
+                  [1,2,3,4,4,3,2,1],
+                  [1,1,2,3,3,2,1,1],
+                  [1,1,1,0,0,1,1,1],
+                  [0,0,0,0,0,0,0,0]]
+
+#black pawn: black pawns are best off on the opposite side(for promotion) or in the center
+blackPawnScore = [[0,0,0,0,0,0,0,0],  
+                  [1,1,1,0,0,1,1,1],
+                  [1,1,2,3,3,2,1,1],
+                  [1,2,3,4,4,3,2,1],
+                  [2,3,3,5,5,3,3,2],
+                  [5,6,6,7,7,6,6,5],
+                  [9,9,9,9,9,9,9,9],
+                  [9,9,9,9,9,9,9,9]]
+
+#dictionary to store pieces and their scores
+positionScores = {"N": knightScore, "B": bishopScore, "Q": queenScore,
+                  "R": rookScore, "wp": whitePawnScore, "bp": blackPawnScore}
+pointMultiplier = 0.1 #multiplier to bring down point weight to reasonable value
+
+#material + position score of each piece on each square (index row * 8 + col) in tenths of a point,
+#positive for white and negative for black. GameState adds these up as pieces move (see GameState.score)
+PIECE_SQUARE_SCORES = {}
+for color, sign in (("w", 1), ("b", -1)):
+    for pieceType in piecePoints:
+        piece = color + pieceType
+        table = positionScores[piece] if pieceType == "p" else positionScores.get(pieceType)
+        PIECE_SQUARE_SCORES[piece] = [0 if table is None else #the king has no position score
+                                      sign * (piecePoints[pieceType] * 10 + table[sq // 8][sq % 8])
+                                      for sq in range(64)]
@@ -0,0 +1,132 @@
+'''
+Move ordering for the alpha beta search: the better the first moves searched, the sooner a node
+can be cut off. Order used: hash move, captures (MVV-LVA), killer moves, quiet moves by history score
+'''
+
+#piece values used to order captures: most valuable victim first, then least valuable attacker
+ORDER_VALUES = {"p": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 10}
+PIECE_INDEX = {piece: i for i, piece in enumerate(("wp", "wN", "wB", "wR", "wQ", "wK",
+                                                    "bp", "bN", "bB", "bR", "bQ", "bK"))}
+KILLER_SLOTS = 2 #quiet moves remembered per ply
+MAX_PLY = 128
+
+#ordering scores, every group is ordered above the next one
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORE = 90000 #first killer, the second one gets 1 less per slot
+HISTORY_LIMIT = 50000 #history scores are halved once one gets this big, so they stay below killers
+
+class MoveOrdering():
+    def __init__(self):
+        self.clear()
+
+    '''
+    Forget all killers and history
+    '''
+    def clear(self):
+        self.killers = [[0] * KILLER_SLOTS for _ in range(MAX_PLY)] #move IDs of quiet moves that caused cutoffs, per ply
+        self.history = [0] * (len(PIECE_INDEX) * 64) #indexed by piece * 64 + end square
+
+    '''
+    Called at the start of every search: killers belong to the old position, history is only aged
+    '''
+    def newSearch(self):
+        self.killers = [[0] * KILLER_SLOTS for _ in range(MAX_PLY)]
+        self.history = [score // 2 for score in self.history]
+
+    '''
+    Score used to sort a move (higher is searched first)
+    '''
+    def scoreMove(self, move, ply, hashMoveID):
+        if move.moveID == hashMoveID:
+            return HASH_MOVE_SCORE
+        if move.isCapture or move.pawnPromotion:
+            score = CAPTURE_SCORE
+            if move.isCapture: #most valuable victim, least valuable attacker
+                score += ORDER_VALUES[move.pieceCaptured[1]] * 100 - ORDER_VALUES[move.pieceMoved[1]]
+            if move.pawnPromotion:
+                score += ORDER_VALUES[move.promotionPiece] * 100
+            return score
+        killers = self.killers[ply]
+        for slot in range(KILLER_SLOTS):
+            if killers[slot] == move.moveID:
+                return KILLER_SCORE - slot
+        return self.history[PIECE_INDEX[move.pieceMoved] * 64 + move.endRow * 8 + move.endCol]
+
+    '''
+    Sort moves in place so the most promising are searched first
+    '''
+    def orderMoves(self, moves, ply, hashMoveID = 0):
+        if ply >= MAX_PLY:
+            ply = MAX_PLY - 1
+        moves.sort(key = lambda move: self.scoreMove(move, ply, hashMoveID), reverse = True)
+
+    '''
+    A quiet move caused a beta cutoff: remember it as a killer at this ply and raise its history score
+    '''
+    def recordCutoff(self, move, ply, depth):
+        if move.isCapture or move.pawnPromotion:
+            return #captures are already ordered first
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move.moveID:
+                killers[1:] = killers[:-1] #shift older killers down a slot
+                killers[0] = move.moveID
+        index = PIECE_INDEX[move.pieceMoved] * 64 + move.endRow * 8 + move.endCol
+        self.history[index] += depth * depth #cutoffs near the root count more
+        if self.history[index] >= HISTORY_LIMIT:
+            self.history = [score // 2 for score in self.history]
+
+    '''
+    Staged move picker: yields the legal moves of gs one at a time, generating each stage only when the
+    search gets to it: hash move, winning and equal captures (and promotions), killers, quiet moves by history,
+    then captures of a defended cheaper piece by a more valuable one. A cutoff early on skips the full move generation
+    '''
+    def pickMoves(self, gs, ply, hashMoveID = 0):
+        if ply >= MAX_PLY:
+            ply = MAX_PLY - 1
+        tried = [] #move IDs already yielded by the single move stages
+        if hashMoveID:
+            move = gs.moveFromID(hashMoveID)
+            if move is not None:
+                tried.append(hashMoveID)
+                yield move
+
+        if gs.kingInCheck(): #only a few evasions, generate them all
+            moves = gs.validMoves()
+            self.orderMoves(moves, ply)
+            for move in moves:
+                if move.moveID not in tried:
+                    yield move
+            return
+
+        captures = gs.captureMoves()
+        captures.sort(key = lambda move: self.scoreMove(move, ply, 0), reverse = True)
+        losingCaptures = []
+        for move in captures:
+            if move.moveID in tried:
+                continue
+            #a more valuable piece taking a defended one probably loses material
+            if move.isCapture and not move.pawnPromotion and \
+                    ORDER_VALUES[move.pieceCaptured[1]] < ORDER_VALUES[move.pieceMoved[1]] and \
+                    gs.isSquareAttacked((move.endRow, move.endCol), move.pieceCaptured[0]):
+                losingCaptures.append(move)
+                continue
+            yield move
+
+        for killerID in list(self.killers[ply]): #a sibling's cutoff can change the killers while we wait
+            if killerID and killerID not in tried:
+                move = gs.moveFromID(killerID)
+                if move is not None and not move.isCapture and not move.pawnPromotion:
+                    tried.append(killerID)
+                    yield move
+
+        history = self.history
+        quietMoves = [move for move in gs.validMoves()
+                      if not move.isCapture and not move.pawnPromotion and move.moveID not in tried]
+        quietMoves.sort(key = lambda move: history[PIECE_INDEX[move.pieceMoved] * 64 + move.endRow * 8 + move.endCol],
+                        reverse = True)
+        for move in quietMoves:
+            yield move
+        for move in losingCaptures:
+            yield move
@@ -0,0 +1,222 @@
+'''
+Opening book: builds a binary book of (position key, move, weight) records sorted by position key from
+a PGN collection, and looks positions up in it by binary search over a memory map of the file. Only the
+pages a lookup touches are read, and every process using the book shares them through the OS page cache
+
+usage: python openingBook.py build GAMES.pgn [MORE.pgn ...] [--out book.bin] [--plies N] [--min-weight N]
+       python openingBook.py probe [FEN] [--book book.bin]
+'''
+
+import argparse
+import mmap
+import random
+import re
+import struct
+import sys
+import ChessEngine
+
+BOOK_MAGIC = b"CEBOOK02" #02: en passant squares only hashed when a capture is possible
+#magic, then the zobrist key of the starting position: keys come from ChessEngine's fixed seed, a book
+#built with other keys would silently give wrong moves
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QHH") #zobrist key, move ID, weight
+BOOK_PLIES = 20 #moves from the start of each game that go into the book
+MAX_WEIGHT = 0xFFFF
+#points for a move by result of the game, from the side of the player who made it: win, draw, loss
+RESULT_WEIGHTS = {"win": 2, "draw": 1, "loss": 0, "*": 1}
+
+#PGN movetext that isn't a move: comments, variations, NAGs, move numbers and results
+PGN_COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+PGN_NOISE = re.compile(r"\$\d+|\d+\.(\.\.)?|1-0|0-1|1/2-1/2|\*")
+
+'''
+Yield (headers, movetext) for every game of a PGN file, reading it one game at a time
+'''
+def readGames(path):
+    headers = {}
+    movetext = []
+    with open(path, errors = "replace") as pgnFile:
+        for line in pgnFile:
+            line = line.strip()
+            if line.startswith("["):
+                if movetext: #tags after movetext start the next game
+                    yield headers, " ".join(movetext)
+                    headers, movetext = {}, []
+                name, _, value = line[1:-1].partition(" ")
+                headers[name] = value.strip('"')
+            elif line:
+                movetext.append(line)
+    if movetext or headers:
+        yield headers, " ".join(movetext)
+
+'''
+SAN tokens of PGN movetext, without comments, variations, annotations and move numbers
+'''
+def sanMoves(movetext):
+    movetext = PGN_COMMENT.sub(" ", movetext)
+    #drop variations, innermost first since they can nest
+    while "(" in movetext:
+        stripped = re.sub(r"\([^()]*\)", " ", movetext)
+        if stripped == movetext: #unbalanced
+            break
+        movetext = stripped
+    return [token.rstrip("+#!?") for token in PGN_NOISE.sub(" ", movetext).split()]
+
+'''
+The move of validMoves written as san (O-O and 0-0, e8=Q and e8Q are both accepted), or None
+'''
+def parseSAN(san, validMoves):
+    san = san.replace("0", "O")
+    if san[0] in "abcdefgh" and san[-1] in "QRBN" and "=" not in san:
+        san = san[:-1] + "=" + san[-1]
+    for move in validMoves:
+        if move.getSanNotation(validMoves) == san:
+            return move
+    return None
+
+'''
+Add the first plies of every game in pgnPaths to a {(zobrist key, move ID): weight} dict. Returns (games read,
+games with a move that couldn't be read, which count up to that move)
+'''
+def collectMoves(pgnPaths, weights, plies = BOOK_PLIES, out = sys.stderr):
+    games = errors = 0
+    for path in pgnPaths:
+        for headers, movetext in readGames(path):
+            games += 1
+            try:
+                gs = ChessEngine.GameState.fromFEN(headers["FEN"]) if "FEN" in headers else ChessEngine.GameState()
+            except ValueError:
+                errors += 1
+                continue
+            result = headers.get("Result", "*")
+            for san in sanMoves(movetext)[:plies]:
+                validMoves = gs.validMoves()
+                move = parseSAN(san, validMoves)
+                if move is None:
+                    errors += 1
+                    break
+                if result == "1/2-1/2":
+                    points = RESULT_WEIGHTS["draw"]
+                elif result in ("1-0", "0-1"):
+                    points = RESULT_WEIGHTS["win" if (result == "1-0") == gs.whiteMove else "loss"]
+                else:
+                    points = RESULT_WEIGHTS["*"]
+                key = (gs.zobristKey, move.moveID)
+                weights[key] = weights.get(key, 0) + points
+                gs.makeMove(move)
+            if games % 1000 == 0:
+                out.write("%d games\r" % games)
+    return games, errors
+
+'''
+Write the book: records sorted by position key, the most played move of each position first
+'''
+def writeBook(path, weights, minWeight = 1):
+    records = sorted(((key, moveID, min(weight, MAX_WEIGHT)) for (key, moveID), weight in weights.items()
+                      if weight >= minWeight), key = lambda record: (record[0], -record[2]))
+    with open(path, "wb") as bookFile:
+        bookFile.write(HEADER.pack(BOOK_MAGIC, ChessEngine.GameState().zobristKey))
+        for record in records:
+            bookFile.write(RECORD.pack(*record))
+    return len(records)
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError: #empty file
+            self.file.close()
+            raise ValueError("not an opening book: " + path)
+        if len(self.data) < HEADER.size or HEADER.unpack_from(self.data, 0)[0] != BOOK_MAGIC:
+            self.close()
+            raise ValueError("not an opening book: " + path)
+        if HEADER.unpack_from(self.data, 0)[1] != ChessEngine.GameState().zobristKey:
+            self.close()
+            raise ValueError("opening book built with different zobrist keys: " + path)
+        self.count = (len(self.data) - HEADER.size) // RECORD.size
+
+    '''
+    Unmap and close the book file
+    '''
+    def close(self):
+        if getattr(self, "data", None) is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    '''
+    Book moves of the position with this zobrist key as a list of (move ID, weight), most played first
+    '''
+    def entries(self, key):
+        data = self.data
+        low, high = 0, self.count
+        while low < high: #first record with a key >= key
+            middle = (low + high) // 2
+            if RECORD.unpack_from(data, HEADER.size + middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for i in range(low, self.count):
+            recordKey, moveID, weight = RECORD.unpack_from(data, HEADER.size + i * RECORD.size)
+            if recordKey != key:
+                break
+            entries.append((moveID, weight))
+        return entries
+
+    '''
+    A book move for gs, picked at random with the weights as odds, or None when the position isn't in the book
+    '''
+    def pickMove(self, gs, validMoves, rng = random):
+        movesByID = {move.moveID: move for move in validMoves}
+        candidates = [(movesByID[moveID], weight) for moveID, weight in self.entries(gs.zobristKey)
+                      if moveID in movesByID and weight > 0] #a key collision can list moves that aren't legal here
+        if not candidates:
+            return None
+        pick = rng.uniform(0, sum(weight for move, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return candidates[-1][0]
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Build or look into a ChessEngine opening book")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    build = commands.add_parser("build", help = "build a book from PGN files")
+    build.add_argument("pgn", nargs = "+", help = "PGN files to read")
+    build.add_argument("--out", default = "book.bin", help = "book file to write (default book.bin)")
+    build.add_argument("--plies", type = int, default = BOOK_PLIES, help = "plies of each game to use (default %d)" % BOOK_PLIES)
+    build.add_argument("--min-weight", type = int, default = 2, help = "leave out moves with less weight (default 2)")
+    probe = commands.add_parser("probe", help = "list the book moves of a position")
+    probe.add_argument("fen", nargs = "?", help = "position (default: the starting position)")
+    probe.add_argument("--book", default = "book.bin", help = "book file (default book.bin)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        weights = {}
+        games, errors = collectMoves(args.pgn, weights, args.plies)
+        count = writeBook(args.out, weights, args.min_weight)
+        print("%d games (%d with unreadable moves), %d book entries written to %s" % (games, errors, count, args.out))
+        return 0
+
+    try:
+        book = OpeningBook(args.book)
+        gs = ChessEngine.GameState.fromFEN(args.fen) if args.fen else ChessEngine.GameState()
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    validMoves = gs.validMoves()
+    movesByID = {move.moveID: move for move in validMoves}
+    for moveID, weight in book.entries(gs.zobristKey):
+        if moveID in movesByID:
+            print("%-8s %6d" % (movesByID[moveID].getSanNotation(validMoves), weight))
+    book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
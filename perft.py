@@ -0,0 +1,90 @@
+'''
+Perft benchmark: counts the leaf nodes of the legal move tree on standard positions, compares them
+with the known values and reports nodes per second, so move generator changes can be checked and timed
+
+usage: python perft.py [--depth N] [--backend mailbox|bitboard] [--position NAME ...] [--fen FEN] [--divide]
+'''
+
+import argparse
+import sys
+import time
+import ChessEngine
+
+#name: (FEN, known leaf counts for depth 1, 2, 3, ...)
+PERFT_SUITE = {
+    "startpos": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                 [20, 400, 8902, 197281, 4865609]),
+    #lots of castling, pins and en passant right from the start
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603]),
+    #en passant discovered checks and pinned pawns in an endgame
+    "enpassant": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  [14, 191, 2812, 43238, 674624]),
+    #castling rights, checks and promotions to every piece
+    "castling": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                 [6, 264, 9467, 422333]),
+    #promotion with capture on the first move
+    "promotion": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [44, 1486, 62379, 2103487]),
+    #symmetrical middlegame
+    "middlegame": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                   [46, 2079, 89890, 3894594]),
+}
+
+'''
+Run perft on each position up to depth, print node counts, whether they match and nodes per second
+Returns True if every count with a known value matched
+'''
+def runSuite(positions, depth, backend = "mailbox", out = sys.stdout):
+    allMatch = True
+    totalNodes = 0
+    totalTime = 0.0
+    for name, (fen, known) in positions.items():
+        gs = ChessEngine.GameState.fromFEN(fen, backend)
+        for d in range(1, depth + 1):
+            start = time.perf_counter()
+            nodes = gs.perft(d)
+            elapsed = time.perf_counter() - start
+            totalNodes += nodes
+            totalTime += elapsed
+            if d <= len(known):
+                status = "ok" if nodes == known[d - 1] else "MISMATCH (expected " + str(known[d - 1]) + ")"
+                allMatch = allMatch and nodes == known[d - 1]
+            else:
+                status = "no known value"
+            out.write("%-12s depth %d  %12d nodes  %8.2fs  %10.0f nps  %s\n" %
+                      (name, d, nodes, elapsed, nodes / elapsed if elapsed > 0 else 0, status))
+    out.write("total %d nodes in %.2fs (%.0f nps)\n" % (totalNodes, totalTime, totalNodes / totalTime if totalTime > 0 else 0))
+    return allMatch
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Perft node counts and speed for ChessEngine")
+    parser.add_argument("--depth", type = int, default = 3, help = "search depth (default 3)")
+    parser.add_argument("--backend", choices = ("mailbox", "bitboard"), default = "mailbox")
+    parser.add_argument("--position", action = "append", choices = sorted(PERFT_SUITE),
+                        help = "suite position to run (repeatable, default all)")
+    parser.add_argument("--fen", help = "run a custom position instead of the suite")
+    parser.add_argument("--divide", action = "store_true", help = "print the node count below each first move")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        positions = {"fen": (args.fen, [])}
+    else:
+        positions = {name: PERFT_SUITE[name] for name in (args.position or PERFT_SUITE)}
+
+    try:
+        if args.divide:
+            for name, (fen, known) in positions.items():
+                counts = ChessEngine.GameState.fromFEN(fen, args.backend).divide(args.depth)
+                for notation in sorted(counts):
+                    print(notation + ": " + str(counts[notation]))
+                print(name + ": " + str(sum(counts.values())) + " nodes")
+            return 0
+        return 0 if runSuite(positions, args.depth, args.backend) else 1
+    except ValueError as error: #bad --fen
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,549 @@
+'''
+Endgame tablebases: retrograde analysis of every position of small endings (KQvK, KRvK, KPvK, 4 piece
+endings like KQvKR) into win/draw/loss + distance to mate tables, one byte per position in a directly
+indexed file, and probing of those files (memory mapped) for the search
+
+usage: python tablebase.py build [SIGNATURE ...] [--dir DIRECTORY]   (default KQvK KRvK KPvK)
+       python tablebase.py probe FEN [--dir DIRECTORY]
+Tables an ending needs after a capture or promotion are built first. 3 piece tables take seconds to
+a minute each, 4 piece tables are 64 times bigger and take a quarter of an hour or more in pure Python
+'''
+
+import argparse
+import array
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+import ChessEngine
+
+TABLEBASE_DIR = "tablebases"
+DEFAULT_SIGNATURES = ("KQvK", "KRvK", "KPvK")
+MAX_PIECES = 5
+TABLE_MAGIC = b"CETB0001"
+HEADER = struct.Struct("<8s16s") #magic, signature
+TABLE_EXTENSION = ".tb"
+PIECE_ORDER = "KQRBNP" #order of the pieces of each side in a signature and in the index
+PIECE_VALUES = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+
+#one byte per position, from the side to move: 0 draw (or illegal position), 1 to 127 win with mate in that
+#many plies, LOSS + n loss getting mated in n plies (LOSS + 0: checkmated)
+DRAW = 0
+LOSS = 128
+MAX_PLIES = 127
+
+#unknown positions end up drawn; resolved ones have their value but their predecessors haven't been updated yet
+UNKNOWN, RESOLVED, DONE, ILLEGAL = 0, 1, 2, 3
+
+#move tables as plain square numbers (a8 = 0, h1 = 63) and bit masks
+KING_TARGETS = [tuple(sq for row, col, sq in ChessEngine.KING_SQUARES[start]) for start in range(64)]
+KNIGHT_TARGETS = [tuple(sq for row, col, sq in ChessEngine.KNIGHT_SQUARES[start]) for start in range(64)]
+RAYS = [[tuple(sq for row, col, sq in ray) for ray in ChessEngine.RAY_SQUARES[start]] for start in range(64)]
+KING_MASKS = [sum(1 << sq for sq in KING_TARGETS[start]) for start in range(64)]
+KNIGHT_MASKS = [sum(1 << sq for sq in KNIGHT_TARGETS[start]) for start in range(64)]
+#squares a pawn of each color captures on from each square
+PAWN_CAPTURES = {color: [tuple(start + forward + side for side in (-1, 1)
+                               if 0 <= start + forward + side < 64 and abs((start + side) % 8 - start % 8) == 1)
+                         if 8 <= start < 56 else () for start in range(64)]
+                 for color, forward in (("w", -8), ("b", 8))}
+PAWN_MASKS = {color: [sum(1 << sq for sq in PAWN_CAPTURES[color][start]) for start in range(64)] for color in "wb"}
+#for two squares on a line: 1 straight, 2 diagonal (0 not on a line) and the mask of the squares between them
+LINE_KINDS = [[0] * 64 for _ in range(64)]
+BETWEEN_MASKS = [[0] * 64 for _ in range(64)]
+for start in range(64):
+    for direction in range(8):
+        between = 0
+        for sq in RAYS[start][direction]:
+            LINE_KINDS[start][sq] = 1 if direction < 4 else 2
+            BETWEEN_MASKS[start][sq] = between
+            between |= 1 << sq
+
+'''
+Split a signature like "KQvKR" into the white and black pieces ("KQ", "KR"), in PIECE_ORDER
+'''
+def parseSignature(signature):
+    white, separator, black = signature.upper().partition("V")
+    if not separator or not white or not black:
+        raise ValueError("signature should look like KQvK: " + signature)
+    for side in (white, black):
+        if side.count("K") != 1 or any(piece not in PIECE_ORDER for piece in side):
+            raise ValueError("each side needs one king and pieces from " + PIECE_ORDER + ": " + signature)
+    if len(white) + len(black) > MAX_PIECES:
+        raise ValueError("at most %d pieces: %s" % (MAX_PIECES, signature))
+    order = lambda side: "".join(sorted(side, key = PIECE_ORDER.index))
+    return order(white), order(black)
+
+'''
+The signature the table of an ending is stored under, and whether the colors have to be swapped to use it
+(the stronger side is white in the table)
+'''
+def canonicalSignature(white, black):
+    strength = lambda side: (sum(PIECE_VALUES[piece] for piece in side), [-PIECE_ORDER.index(piece) for piece in side])
+    if strength(black) > strength(white):
+        return black + "v" + white, True
+    return white + "v" + black, False
+
+'''
+Whether neither side can ever mate: bare kings, or a single bishop or knight
+'''
+def insufficientMaterial(white, black):
+    pieces = white[1:] + black[1:]
+    return pieces in ("", "B", "N")
+
+
+class Tablebases():
+    '''
+    The tables of a directory, each memory mapped when first needed. Tables built by buildTable are kept in
+    memory and used for the endings built after them
+    '''
+    def __init__(self, directory = TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {} #signature -> values (mmap or bytearray), None when there is no such table
+        self.files = []
+        self.layouts = {} #(white, black) -> (values, colors swapped, slot of each piece type per color), see layout
+        self.maxPieces = 0
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(TABLE_EXTENSION):
+                    self.maxPieces = max(self.maxPieces, len(name) - len(TABLE_EXTENSION) - 1)
+
+    '''
+    Unmap every table file
+    '''
+    def close(self):
+        for tableFile, data, values in self.files:
+            values.release()
+            data.close()
+            tableFile.close()
+        self.files = []
+        self.tables = {}
+        self.layouts = {}
+
+    '''
+    Values of the table with this signature, or None if it hasn't been built
+    '''
+    def table(self, signature):
+        if signature not in self.tables:
+            path = os.path.join(self.directory, signature + TABLE_EXTENSION)
+            values = None
+            if os.path.exists(path):
+                tableFile = open(path, "rb")
+                data = mmap.mmap(tableFile.fileno(), 0, access = mmap.ACCESS_READ)
+                magic, stored = HEADER.unpack_from(data, 0)
+                if magic != TABLE_MAGIC or stored.rstrip(b"\0").decode() != signature:
+                    data.close()
+                    tableFile.close()
+                    raise ValueError("not a tablebase file for " + signature + ": " + path)
+                values = memoryview(data)[HEADER.size:]
+                self.files.append((tableFile, data, values))
+            self.tables[signature] = values
+        return self.tables[signature]
+
+    '''
+    How positions with white and black pieces ("KQ", "K") map into a table: (values, colors swapped, piece type
+    -> index slots for each color). values is None when there is no table, and DRAW for insufficient material
+    '''
+    def layout(self, white, black):
+        key = (white, black)
+        if key not in self.layouts:
+            if insufficientMaterial(white, black):
+                self.layouts[key] = (DRAW, False, None)
+            else:
+                signature, swapped = canonicalSignature(white, black)
+                tableWhite, tableBlack = (black, white) if swapped else (white, black)
+                slots = {"w": {}, "b": {}}
+                for slot, (color, piece) in enumerate([("w", piece) for piece in tableWhite] +
+                                                      [("b", piece) for piece in tableBlack]):
+                    slots[color].setdefault(piece, []).append(slot)
+                self.layouts[key] = (self.table(signature), swapped, slots)
+        return self.layouts[key]
+
+    '''
+    Value of a position given as a list of (color, piece type, square) and the side to move, or None when
+    its table isn't available
+    '''
+    def lookup(self, pieces, blackToMove):
+        order = lambda color: "".join(sorted((piece for pieceColor, piece, sq in pieces if pieceColor == color),
+                                             key = PIECE_ORDER.index))
+        values, swapped, slots = self.layout(order("w"), order("b"))
+        if values is None or values is DRAW:
+            return values
+        squares = [0] * len(pieces)
+        used = {}
+        for color, piece, sq in pieces:
+            if swapped: #the table has the colors the other way round, and the board upside down
+                color = "b" if color == "w" else "w"
+                sq ^= 56
+            key = (color, piece)
+            slot = slots[color][piece][used.get(key, 0)]
+            used[key] = used.get(key, 0) + 1
+            squares[slot] = sq
+        index = 1 if blackToMove != swapped else 0
+        for sq in squares:
+            index = index * 64 + sq
+        return values[index]
+
+    '''
+    Table value of gs for its side to move, or None when gs isn't covered (too many pieces, no table, or castle
+    rights or an en passant capture, which the tables leave out)
+    '''
+    def probe(self, gs):
+        if gs.pieceCount > self.maxPieces:
+            return None
+        if gs.enPassantCapturePossible():
+            return None
+        castle = gs.currentCastle
+        if castle.wks or castle.wqs or castle.bks or castle.bqs:
+            return None
+        pieces = [(piece[0], piece[1].upper(), row * 8 + col) for row in range(8) for col in range(8)
+                  for piece in (gs.board[row][col],) if piece != "--"]
+        return self.lookup(pieces, not gs.whiteMove)
+
+    '''
+    The best move of validMoves by the tables: the fastest win, else a draw, else the longest loss. Returns
+    (move, value of the position for the side to move) or None when a position isn't covered
+    '''
+    def bestMove(self, gs, validMoves):
+        best = None
+        for move in validMoves:
+            gs.makeMove(move)
+            value = self.probe(gs)
+            gs.undoMove()
+            if value is None:
+                return None
+            mine = childValue(value)
+            if best is None or valueOrder(mine) > valueOrder(best[1]):
+                best = (move, mine)
+        return best
+
+'''
+Value of a position for its side to move from the value of the position after its best move (seen from the opponent)
+'''
+def childValue(value):
+    if value == DRAW:
+        return DRAW
+    if value >= LOSS: #the opponent gets mated: a win one ply later
+        return value - LOSS + 1
+    return LOSS + value + 1
+
+'''
+Sort key of values for the side to move: quick wins first, then slow wins, draws, slow losses, quick losses
+'''
+def valueOrder(value):
+    if value == DRAW:
+        return 0
+    if value >= LOSS:
+        return -1000 + (value - LOSS)
+    return 1000 - value
+
+'''
+(outcome, plies) of a value: outcome 1 win, 0 draw, -1 loss for the side to move
+'''
+def decodeValue(value):
+    if value == DRAW:
+        return 0, 0
+    if value >= LOSS:
+        return -1, value - LOSS
+    return 1, value
+
+'''
+Whether any piece in pieces (list of (piece type, square)) of color attacks sq, with occupied as the board mask
+'''
+def attacked(sq, color, pieces, occupied):
+    for piece, start in pieces:
+        if piece == "K":
+            if KING_MASKS[start] >> sq & 1:
+                return True
+        elif piece == "N":
+            if KNIGHT_MASKS[start] >> sq & 1:
+                return True
+        elif piece == "P":
+            if PAWN_MASKS[color][start] >> sq & 1:
+                return True
+        else:
+            kind = LINE_KINDS[start][sq]
+            if kind and (piece == "Q" or (kind == 1) == (piece == "R")) and not BETWEEN_MASKS[start][sq] & occupied:
+                return True
+    return False
+
+'''
+Signatures of the endings a capture or promotion in this one leads to
+'''
+def dependencies(white, black):
+    children = set()
+    for side, other, swap in ((white, black, False), (black, white, True)):
+        for i, piece in enumerate(side):
+            if piece == "K":
+                continue
+            removed = side[:i] + side[i + 1:]
+            children.add((other, removed) if swap else (removed, other)) #captured
+            if piece == "P":
+                for promoted in "QRBN":
+                    newSide = "".join(sorted(removed + promoted, key = PIECE_ORDER.index))
+                    children.add((other, newSide) if swap else (newSide, other))
+    return sorted(canonicalSignature(w, b)[0] for w, b in children if not insufficientMaterial(w, b))
+
+'''
+Build the table of one ending by retrograde analysis and write it to tablebases.directory. Tables of the
+endings it converts into must be available in tablebases. Returns the values
+'''
+def buildTable(signature, tablebases, out = sys.stderr):
+    white, black = parseSignature(signature)
+    signature = white + "v" + black
+    colors = ["w"] * len(white) + ["b"] * len(black)
+    types = list(white + black)
+    count = len(types)
+    size = 2 * 64 ** count
+    stmWeight = 64 ** count
+    weights = [64 ** (count - 1 - i) for i in range(count)]
+    kings = {"w": 0, "b": len(white)}
+    start = time.perf_counter()
+
+    values = bytearray(size)
+    state = bytearray(size)
+    remaining = bytearray(size) #moves staying in this table whose result isn't known yet
+    drawExit = bytearray(size) #1 if a capture or promotion reaches a draw
+    winExit = bytearray(size) #1 if a capture or promotion wins
+    lossExit = bytearray(size) #longest loss through a capture or promotion
+    #positions to settle by plies to mate, as arrays: lists of ints take 9 times the memory on 4 piece tables
+    winBuckets = [array.array("L") for _ in range(MAX_PLIES + 2)]
+    lossBuckets = [array.array("L") for _ in range(MAX_PLIES + 2)]
+
+    #first pass: legality, moves out of the table and checkmates
+    for index, position in enumerate(itertools.product(range(2), *[range(64)] * count)):
+        stm = "b" if position[0] else "w"
+        them = "w" if position[0] else "b"
+        squares = position[1:]
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        if bin(occupied).count("1") != count or \
+                KING_MASKS[squares[kings["w"]]] >> squares[kings["b"]] & 1 or \
+                any(types[i] == "P" and not 8 <= squares[i] < 56 for i in range(count)):
+            state[index] = ILLEGAL
+            continue
+        ours = [(types[i], squares[i]) for i in range(count) if colors[i] == stm]
+        theirs = [(types[i], squares[i]) for i in range(count) if colors[i] == them]
+        if attacked(squares[kings[them]], stm, ours, occupied): #the side that just moved left its king in check
+            state[index] = ILLEGAL
+            continue
+
+        legalMoves = 0
+        inTable = 0
+        for i, end, captured, promoted in pieceMoves(squares, types, colors, stm, occupied):
+            newSquares = list(squares)
+            newSquares[i] = end
+            newOccupied = (occupied & ~(1 << squares[i])) | (1 << end)
+            enemies = [(types[j], newSquares[j]) for j in range(count) if colors[j] == them and j != captured]
+            if attacked(newSquares[kings[stm]], them, enemies, newOccupied):
+                continue
+            legalMoves += 1
+            if captured < 0 and promoted is None:
+                inTable += 1
+                continue
+            pieces = [(colors[j], promoted if j == i and promoted else types[j], newSquares[j])
+                      for j in range(count) if j != captured]
+            value = tablebases.lookup(pieces, stm == "w")
+            if value is None:
+                raise ValueError("table needed by " + signature + " is missing: " +
+                                 ", ".join(dependencies(white, black)))
+            mine = childValue(value)
+            if mine == DRAW:
+                drawExit[index] = 1
+            elif mine >= LOSS:
+                lossExit[index] = max(lossExit[index], mine - LOSS)
+            else:
+                winExit[index] = 1
+                winBuckets[mine].append(index)
+        if legalMoves == 0:
+            if attacked(squares[kings[stm]], them, theirs, occupied):
+                lossBuckets[0].append(index) #checkmate
+            else:
+                state[index] = DONE #stalemate
+        elif inTable == 0 and not winExit[index] and not drawExit[index]: #every move converts into a loss
+            lossBuckets[lossExit[index]].append(index)
+        remaining[index] = inTable
+
+    #then work back from the mates: a position is won if one move reaches a lost position, and lost in n
+    #plies once every move reaches a position won for the opponent
+    for plies in range(MAX_PLIES + 1):
+        for index in lossBuckets[plies]:
+            if state[index] == UNKNOWN or (state[index] == RESOLVED and values[index] == LOSS + plies):
+                values[index] = LOSS + plies
+                state[index] = DONE
+                for previous in predecessors(index, types, colors, weights, stmWeight, count):
+                    if state[previous] == UNKNOWN:
+                        values[previous] = plies + 1
+                        state[previous] = RESOLVED
+                        winBuckets[plies + 1].append(previous)
+        for index in winBuckets[plies]:
+            if state[index] == UNKNOWN: #won by a capture or promotion
+                values[index] = plies
+            elif state[index] != RESOLVED or values[index] != plies:
+                continue
+            state[index] = DONE
+            for previous in predecessors(index, types, colors, weights, stmWeight, count):
+                if state[previous] == UNKNOWN:
+                    remaining[previous] -= 1
+                    if remaining[previous] == 0 and not winExit[previous] and not drawExit[previous]:
+                        lossPlies = max(plies + 1, lossExit[previous])
+                        values[previous] = LOSS + lossPlies
+                        state[previous] = RESOLVED
+                        lossBuckets[lossPlies].append(previous)
+    if len(winBuckets[MAX_PLIES + 1]) or len(lossBuckets[MAX_PLIES + 1]):
+        raise ValueError(signature + " has mates longer than %d plies" % MAX_PLIES)
+
+    os.makedirs(tablebases.directory, exist_ok = True)
+    path = os.path.join(tablebases.directory, signature + TABLE_EXTENSION)
+    with open(path, "wb") as tableFile:
+        tableFile.write(HEADER.pack(TABLE_MAGIC, signature.encode()))
+        tableFile.write(values)
+    tablebases.tables[signature] = values
+    tablebases.layouts = {}
+    tablebases.maxPieces = max(tablebases.maxPieces, count)
+    wins = sum(1 for value in values if 0 < value < LOSS)
+    losses = sum(1 for value in values if value >= LOSS)
+    out.write("%s: %d positions, %d wins, %d losses for the side to move, longest mate %d plies, %.1fs\n" %
+              (signature, size, wins, losses, max(max(value for value in values if value < LOSS),
+                                                    max((value - LOSS for value in values if value >= LOSS), default = 0)),
+               time.perf_counter() - start))
+    return values
+
+'''
+Pseudo legal moves of color as (piece index, end square, index of the captured piece or -1, promotion piece or None)
+'''
+def pieceMoves(squares, types, colors, color, occupied):
+    for i, piece in enumerate(types):
+        if colors[i] != color:
+            continue
+        start = squares[i]
+        if piece == "P":
+            forward = -8 if color == "w" else 8
+            end = start + forward
+            if not occupied >> end & 1:
+                if end < 8 or end >= 56:
+                    for promoted in "QRBN":
+                        yield i, end, -1, promoted
+                else:
+                    yield i, end, -1, None
+                    if (start >= 48 if color == "w" else start < 16) and not occupied >> (end + forward) & 1:
+                        yield i, end + forward, -1, None
+            for end in PAWN_CAPTURES[color][start]:
+                if occupied >> end & 1:
+                    captured = squares.index(end)
+                    if colors[captured] != color:
+                        for promoted in ("QRBN" if end < 8 or end >= 56 else (None,)):
+                            yield i, end, captured, promoted
+            continue
+        if piece == "K" or piece == "N":
+            targets = [KING_TARGETS[start] if piece == "K" else KNIGHT_TARGETS[start]]
+        else:
+            targets = [RAYS[start][direction] for direction in ChessEngine.SLIDER_DIRECTIONS[piece]]
+        for ray in targets:
+            for end in ray:
+                if occupied >> end & 1:
+                    captured = squares.index(end)
+                    if colors[captured] != color and types[captured] != "K":
+                        yield i, end, captured, None
+                    if piece != "K" and piece != "N":
+                        break #sliders stop at the first piece
+                else:
+                    yield i, end, -1, None
+
+'''
+Indexes of the positions this one can be reached from by a move that stays in the table (no capture or
+promotion): the side that is not to move takes back one of its moves
+'''
+def predecessors(index, types, colors, weights, stmWeight, count):
+    blackToMove = index >= stmWeight
+    mover = "w" if blackToMove else "b"
+    rest = index - stmWeight if blackToMove else index
+    squares = []
+    for weight in weights:
+        squares.append(rest // weight)
+        rest %= weight
+    occupied = 0
+    for sq in squares:
+        occupied |= 1 << sq
+    base = index + (-stmWeight if blackToMove else stmWeight) #same pieces, other side to move
+    for i in range(count):
+        if colors[i] != mover:
+            continue
+        piece = types[i]
+        end = squares[i]
+        if piece == "P": #pawns only move forward, so they come from behind
+            backward = 8 if mover == "w" else -8
+            start = end + backward
+            if 8 <= start < 56 and not occupied >> start & 1:
+                yield base + (start - end) * weights[i]
+                if (end >= 32 and end < 40 if mover == "w" else 24 <= end < 32) and \
+                        not occupied >> (start + backward) & 1:
+                    yield base + (start + backward - end) * weights[i]
+            continue
+        if piece == "K" or piece == "N":
+            rays = [KING_TARGETS[end] if piece == "K" else KNIGHT_TARGETS[end]]
+        else:
+            rays = [RAYS[end][direction] for direction in ChessEngine.SLIDER_DIRECTIONS[piece]]
+        for ray in rays:
+            for start in ray:
+                if occupied >> start & 1:
+                    if piece != "K" and piece != "N":
+                        break
+                    continue
+                yield base + (start - end) * weights[i]
+
+'''
+Build the tables for signatures in directory, with the tables they convert into first (existing files are kept)
+'''
+def buildTables(signatures, directory = TABLEBASE_DIR, out = sys.stderr):
+    tablebases = Tablebases(directory)
+    def build(signature):
+        white, black = parseSignature(signature)
+        signature = canonicalSignature(white, black)[0]
+        if tablebases.table(signature) is not None:
+            return
+        for child in dependencies(white, black):
+            build(child)
+        buildTable(signature, tablebases, out)
+    for signature in signatures:
+        build(signature)
+    tablebases.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Build or probe ChessEngine endgame tablebases")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    build = commands.add_parser("build", help = "generate tables")
+    build.add_argument("signatures", nargs = "*", default = list(DEFAULT_SIGNATURES),
+                       help = "endings like KQvK or KRvKP (default: " + " ".join(DEFAULT_SIGNATURES) + ")")
+    build.add_argument("--dir", default = TABLEBASE_DIR, help = "directory of the tables (default %s)" % TABLEBASE_DIR)
+    probe = commands.add_parser("probe", help = "look up a position and its best move")
+    probe.add_argument("fen", help = "position")
+    probe.add_argument("--dir", default = TABLEBASE_DIR, help = "directory of the tables (default %s)" % TABLEBASE_DIR)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            buildTables(args.signatures, args.dir)
+            return 0
+        tablebases = Tablebases(args.dir)
+        gs = ChessEngine.GameState.fromFEN(args.fen)
+    except ValueError as error:
+        parser.error(str(error))
+    value = tablebases.probe(gs)
+    if value is None:
+        print("not in the tables")
+        return 1
+    outcome, plies = decodeValue(value)
+    print(("draw", "win, mate in %d plies" % plies, "loss, mated in %d plies" % plies)[outcome])
+    best = tablebases.bestMove(gs, gs.validMoves())
+    if best is not None:
+        print("best move " + best[0].getChessNotation())
+    tablebases.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
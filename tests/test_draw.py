@@ -0,0 +1,26 @@
+import pytest
+import ChessEngine
+import chessAI
+
+
+def test_checkmate_on_the_hundredth_ply_is_not_a_draw():
+    gs = ChessEngine.GameState.fromFEN("7k/6Q1/6K1/8/8/8/8/8 b - - 100 80")
+    assert not gs.isDraw()
+    assert gs.checkMate
+
+
+def test_fifty_move_rule_without_mate_is_a_draw():
+    assert ChessEngine.GameState.fromFEN("7k/8/6K1/8/8/8/8/6Q1 b - - 100 80").isDraw()
+    #in check but with a way out
+    assert ChessEngine.GameState.fromFEN("7k/8/6K1/8/8/8/8/7Q b - - 100 80").isDraw()
+
+
+@pytest.mark.parametrize("backend", ("mailbox", "bitboard"))
+def test_search_finds_mate_on_the_hundredth_ply(backend):
+    #Qa8 and Qg7 mate with the last move the fifty-move rule allows
+    gs = ChessEngine.GameState.fromFEN("7k/Q7/6K1/8/8/8/8/8 w - - 99 80", backend)
+    result = chessAI.Searcher(2).search(gs)
+    assert result.score >= chessAI.MATE_BOUND
+    gs.makeMove(result.move)
+    gs.validMoves()
+    assert gs.checkMate
@@ -0,0 +1,47 @@
+import pytest
+import ChessEngine
+
+BACKENDS = ("mailbox", "bitboard")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_en_passant_square_without_pushed_pawn_is_rejected(backend):
+    #e3 with black to move, but there is no white pawn on e4
+    with pytest.raises(ValueError):
+        ChessEngine.GameState.fromFEN("4k3/8/8/8/3p4/8/8/4K3 b - e3 0 1", backend)
+
+
+@pytest.mark.parametrize("fen", [
+    "4k3/8/8/3pP3/8/8/8/4K3 b - d6 0 1", #rank 6 needs white to move
+    "4k3/8/3p4/3pP3/8/8/8/4K3 w - d6 0 1", #the en passant square is taken
+    "4k3/3p4/8/3pP3/8/8/8/4K3 w - d6 0 1", #the pawn can't have come from d7
+])
+def test_impossible_en_passant_squares_are_rejected(fen):
+    with pytest.raises(ValueError):
+        ChessEngine.GameState.fromFEN(fen)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_en_passant_after_double_push_is_loaded(backend):
+    gs = ChessEngine.GameState.fromFEN("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", backend)
+    assert gs.enPassantPossible == (2, 3)
+    assert "e5d6" in [move.getChessNotation() for move in gs.validMoves()]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_castle_right_without_rook_is_dropped(backend):
+    gs = ChessEngine.GameState.fromFEN("4k3/8/8/8/8/8/8/4K3 w K - 0 1", backend)
+    assert not gs.currentCastle.wks
+    assert gs.toFEN().split()[2] == "-"
+    assert not any(move.castle for move in gs.validMoves())
+
+
+def test_castle_rights_need_king_and_rook_at_home():
+    gs = ChessEngine.GameState.fromFEN("r3k3/8/8/8/8/8/8/R4K1R w KQkq - 0 1")
+    assert gs.toFEN().split()[2] == "q"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_castle_moves_agree_between_backends(backend):
+    gs = ChessEngine.GameState.fromFEN("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", backend)
+    assert sorted(move.getChessNotation() for move in gs.validMoves() if move.castle) == ["e1c1", "e1g1"]
@@ -0,0 +1,82 @@
+import pytest
+import ChessEngine
+import chessAI
+
+POSITIONS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/3n4/8/3k4/8/8/8/R3K2R w - - 0 1", #rook checks leave the king many quiet ways out
+    "8/3n4/8/3k4/8/8/8/R3K2R b - - 0 1", #and with black to move the rooks have quiet checks late in the move list
+]
+
+
+class RecordingSearcher(chessAI.Searcher):
+    '''
+    Searcher that records every late move reduction as (ply, parent in check, parent had ordering, child in check)
+    '''
+    def __init__(self, depth, iterative):
+        #no null moves, so a child two plies shallower than its parent can only be a reduced late move
+        super().__init__(depth, nullMove = False)
+        if iterative: #as bestMove searches with a time limit, else straight to full depth without a previous PV
+            self.onIteration = lambda result: None
+        self.parents = []
+        self.reductions = []
+
+    def negaMax(self, gs, validMoves, depth, alpha, beta, scoreSelector, ply):
+        if self.parents and depth == self.parents[-1][0] - 2:
+            parentDepth, inCheck, ordered = self.parents[-1]
+            self.reductions.append((ply - 1, inCheck, ordered, gs.kingInCheck()))
+        entry = self.transpositionTable.probe(gs.zobristKey)
+        ordered = (entry is not None and entry[3] != 0) or len(self.previousPV) != 0
+        self.parents.append((depth, gs.kingInCheck(), ordered))
+        try:
+            return super().negaMax(gs, validMoves, depth, alpha, beta, scoreSelector, ply)
+        finally:
+            self.parents.pop()
+
+
+@pytest.mark.parametrize("iterative", (True, False))
+@pytest.mark.parametrize("fen", POSITIONS)
+def test_late_move_reductions_only_where_allowed(fen, iterative):
+    searcher = RecordingSearcher(4, iterative)
+    result = searcher.search(ChessEngine.GameState.fromFEN(fen))
+    assert result.depth == 4
+    for ply, inCheck, ordered, givesCheck in searcher.reductions:
+        assert ply != 0
+        assert not inCheck
+        assert ordered
+        assert not givesCheck
+
+
+def test_reductions_happen_at_depth_four():
+    #an earlier iteration orders the moves, and depth 4 leaves depth 3 below the root
+    searcher = RecordingSearcher(4, True)
+    searcher.search(ChessEngine.GameState.fromFEN(POSITIONS[0]))
+    assert searcher.reductions
+
+
+def test_no_reductions_when_turned_off():
+    searcher = RecordingSearcher(4, True)
+    searcher.lateMoveReductions = False
+    searcher.search(ChessEngine.GameState.fromFEN(POSITIONS[0]))
+    assert searcher.reductions == []
+
+
+def test_tablebase_scores_count_plies_from_the_root():
+    #mate in 28 plies after one move is quicker than mate in 28 plies after three
+    assert chessAI.tablebaseScore(28, 1) > chessAI.tablebaseScore(28, 3)
+    assert chessAI.tablebaseScore(28, 1) == pytest.approx(chessAI.TABLEBASE_WIN - 2.9)
+    #and being mated later is better
+    assert chessAI.tablebaseScore(128 + 28, 3) > chessAI.tablebaseScore(128 + 28, 1)
+    assert chessAI.tablebaseScore(128 + 28, 1) == -chessAI.tablebaseScore(28, 1)
+
+
+@pytest.mark.parametrize("score", [1.5, chessAI.tablebaseScore(5, 3), chessAI.tablebaseScore(128 + 5, 3)])
+def test_transposition_table_scores_move_with_the_node(score):
+    #stored at ply 3 and found again at ply 7: a table result is 4 plies further away, other scores don't change
+    moved = chessAI.scoreFromTable(chessAI.scoreToTable(score, 3), 7)
+    if abs(score) >= chessAI.TABLEBASE_BOUND:
+        assert moved == pytest.approx(score - 0.4 if score > 0 else score + 0.4)
+    else:
+        assert moved == score
@@ -0,0 +1,37 @@
+import io
+import pytest
+import ChessEngine
+import chessAI
+import uci
+
+
+def infoScore(score, pv = ()):
+    out = io.StringIO()
+    uci.UCIEngine(out).sendInfo(chessAI.SearchResult(None, score, list(pv), 100, 0.5, 4))
+    line = out.getvalue().split()
+    return " ".join(line[line.index("score") + 1:line.index("nodes")])
+
+
+@pytest.mark.parametrize("score, expected", [
+    (chessAI.CHECKMATE - 0.1, "mate 1"), #mates with its next move
+    (chessAI.CHECKMATE - 0.3, "mate 2"),
+    (-chessAI.CHECKMATE + 0.2, "mate -1"), #gets mated after its next move
+    (chessAI.tablebaseScore(28, 1), "mate 15"), #table win 29 plies from the root
+    (chessAI.tablebaseScore(128 + 28, 1), "mate -15"),
+    (1.25, "cp 125"),
+])
+def test_mate_scores_are_reported_in_moves(score, expected):
+    assert infoScore(score) == expected
+
+
+def test_mate_distance_comes_from_the_score_not_the_pv():
+    #a PV cut short (here to nothing) by the transposition table still reports the whole mate
+    assert infoScore(chessAI.CHECKMATE - 0.5) == "mate 3"
+
+
+def test_search_reports_quickest_mate():
+    #Ra8 mates at once, other moves mate later
+    gs = ChessEngine.GameState.fromFEN("6k1/5ppp/8/8/8/8/8/R3K2R w KQ - 0 1")
+    result = chessAI.Searcher(4).search(gs)
+    assert result.move.getChessNotation() == "a1a8"
+    assert result.score == pytest.approx(chessAI.CHECKMATE - 0.1)
@@ -0,0 +1,256 @@
+'''
+Headless self-play tournament: plays engine vs engine games between two player configurations over a
+process pool and streams every finished game to a PGN file, with the time and nodes of each move in
+the move comments, so strength and speed changes can be measured without the pygame window
+
+usage: python tournament.py PLAYER PLAYER [--games N] [--workers N] [--openings FILE] [--pgn FILE]
+players: random | greedy | alphabeta[:depth=D][,time=SECONDS][,nodes=N][,hash=MB][,nullmove=0|1][,lmr=0|1]
+example: python tournament.py alphabeta:depth=3 alphabeta:depth=2 --games 20 --workers 4
+'''
+
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+import ChessEngine
+import chessAI
+import transposition
+
+'''
+Parse a player description like "alphabeta:depth=3,time=0.5" into (kind, {option: value})
+'''
+def parsePlayer(spec):
+    kind, _, optionText = spec.partition(":")
+    if kind not in ("random", "greedy", "alphabeta"):
+        raise ValueError("unknown player: " + spec)
+    options = {}
+    for option in filter(None, optionText.split(",")):
+        name, _, value = option.partition("=")
+        if name not in ("depth", "time", "nodes", "hash", "nullmove", "lmr") or not value:
+            raise ValueError("bad option '" + option + "' in player " + spec)
+        options[name] = float(value) if name == "time" else int(value)
+    return kind, options
+
+'''
+Build a function gs, validMoves -> (move, nodes searched) for a player description
+'''
+def makePlayer(spec):
+    kind, options = parsePlayer(spec)
+    if kind == "random":
+        return lambda gs, validMoves: (chessAI.makeRandomMove(validMoves), 0)
+    if kind == "greedy": #material only, two ply
+        return lambda gs, validMoves: (chessAI.makeBestMove(gs, validMoves[:]), 0)
+    searcher = chessAI.Searcher(options.get("depth", chessAI.DEPTH if "time" not in options else chessAI.MAX_DEPTH),
+                                options.get("time"), options.get("nodes"),
+                                transposition.TranspositionTable(options.get("hash", chessAI.TT_SIZE_MB)),
+                                nullMove = bool(options.get("nullmove", 1)), lateMoveReductions = bool(options.get("lmr", 1)))
+    def alphabeta(gs, validMoves):
+        result = searcher.search(gs, validMoves)
+        return result.move, result.nodes
+    return alphabeta
+
+'''
+Plays one game. task: (game number, white player, black player, opening, max plies, backend, seed) where
+opening is (FEN of the start position or None, moves played from it). Returns a dict with the players,
+result, termination reason, start FEN (or None) and the moves as (SAN, seconds, nodes)
+'''
+def playGame(task):
+    number, whiteSpec, blackSpec, (fen, opening), maxPlies, backend, seed = task
+    random.seed(seed)
+    players = {True: makePlayer(whiteSpec), False: makePlayer(blackSpec)}
+    gs = ChessEngine.GameState.fromFEN(fen, backend) if fen else ChessEngine.GameState(backend)
+    firstMove = (gs.fullmoveNumber, gs.whiteMove)
+    validMoves = gs.validMoves()
+    moves = [] #(SAN, seconds, nodes), seconds is None for opening moves
+    for notation in opening:
+        move = next((move for move in validMoves if move.getChessNotation() == notation), None)
+        if move is None:
+            raise ValueError("illegal opening move " + notation + " in game " + str(number))
+        moves.append(playMove(gs, move, validMoves, None, None))
+        validMoves = gs.validMoves()
+
+    termination = "normal"
+    while not gs.checkMate and not gs.staleMate:
+        if gs.halfmoveClock >= ChessEngine.FIFTY_MOVE_PLIES:
+            termination = "fifty-move rule"
+            break
+        if gs.repetitions(2) >= 2:
+            termination = "threefold repetition"
+            break
+        if len(gs.moveLog) >= maxPlies:
+            termination = "adjudication" #move limit, scored as a draw
+            break
+        start = time.perf_counter()
+        move, nodes = players[gs.whiteMove](gs, validMoves)
+        if move is None: #greedy finds nothing when every move loses
+            move = chessAI.makeRandomMove(validMoves)
+        seconds = time.perf_counter() - start
+        moves.append(playMove(gs, move, validMoves, seconds, nodes))
+        validMoves = gs.validMoves()
+
+    if gs.checkMate:
+        result = "0-1" if gs.whiteMove else "1-0"
+    else:
+        result = "1/2-1/2"
+    return {"number": number, "white": whiteSpec, "black": blackSpec, "result": result,
+            "termination": termination, "fen": fen, "firstMove": firstMove, "moves": moves}
+
+'''
+Make move and return its (SAN with check suffix, seconds, nodes) record
+'''
+def playMove(gs, move, validMoves, seconds, nodes):
+    notation = move.getSanNotation(validMoves)
+    gs.makeMove(move)
+    gs.validMoves() #sets checkMate
+    if gs.checkMate:
+        notation += "#"
+    elif gs.inCheck:
+        notation += "+"
+    return notation, seconds, nodes
+
+'''
+PGN text of a finished game; engine moves carry a {seconds nodes} comment
+'''
+def gamePGN(game, event):
+    lines = ['[Event "' + event + '"]', '[Site "?"]', '[Date "' + time.strftime("%Y.%m.%d") + '"]',
+             '[Round "' + str(game["number"]) + '"]', '[White "' + game["white"] + '"]',
+             '[Black "' + game["black"] + '"]', '[Result "' + game["result"] + '"]',
+             '[Termination "' + game["termination"] + '"]']
+    if game["fen"]:
+        lines += ['[SetUp "1"]', '[FEN "' + game["fen"] + '"]']
+    lines.append('')
+    tokens = []
+    moveNumber, whiteMove = game["firstMove"]
+    if not whiteMove and game["moves"]:
+        tokens.append(str(moveNumber) + "...")
+    for notation, seconds, nodes in game["moves"]:
+        if whiteMove:
+            tokens.append(str(moveNumber) + ".")
+        else:
+            moveNumber += 1
+        whiteMove = not whiteMove
+        tokens.append(notation)
+        if seconds is not None:
+            tokens.append("{%.3fs %d nodes}" % (seconds, nodes))
+    tokens.append(game["result"])
+    #wrap movetext at 80 characters
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 80:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+'''
+Read openings, one per line: either a FEN or moves from the starting position in coordinate notation
+(e2e4 e7e5 ...). # starts a comment. Returns a list of (FEN or None, moves)
+'''
+def readOpenings(path):
+    openings = []
+    with open(path) as openingFile:
+        for line in openingFile:
+            line = line.split("#")[0].strip()
+            if "/" in line:
+                ChessEngine.GameState.fromFEN(line) #raises ValueError now rather than in a worker
+                openings.append((line, []))
+            elif line:
+                openings.append((None, line.split()))
+    return openings
+
+'''
+Play games games between playerA and playerB (swapping colors every game, each opening is played once with
+each color) on a pool of workers processes. Every game is appended to pgnPath as soon as it ends.
+Returns {player: [wins, draws, losses, seconds thinking, nodes searched, moves]}
+'''
+def runTournament(playerA, playerB, games, workers = 1, openings = None, maxPlies = 200, backend = "mailbox",
+                  pgnPath = "tournament.pgn", seed = 0, out = sys.stdout):
+    for spec in (playerA, playerB):
+        parsePlayer(spec) #fail before starting any process
+    openings = openings or [(None, [])]
+    tasks = []
+    for number in range(games):
+        white, black = (playerA, playerB) if number % 2 == 0 else (playerB, playerA)
+        tasks.append((number + 1, white, black, openings[(number // 2) % len(openings)], maxPlies, backend, seed + number))
+    #both players get the same name in the table if they are the same configuration
+    stats = {spec: [0, 0, 0, 0.0, 0, 0] for spec in (playerA, playerB)}
+    event = playerA + " vs " + playerB
+    with open(pgnPath, "a") as pgnFile:
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+            finished = pool.imap_unordered(playGame, tasks)
+        else:
+            pool = None
+            finished = map(playGame, tasks)
+        try:
+            for game in finished:
+                pgnFile.write(gamePGN(game, event))
+                pgnFile.flush()
+                recordGame(stats, game)
+                out.write("game %d: %s - %s  %s (%s, %d plies)\n" % (game["number"], game["white"], game["black"],
+                                                                      game["result"], game["termination"], len(game["moves"])))
+                out.flush()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+    return stats
+
+'''
+Add a finished game to the per player statistics
+'''
+def recordGame(stats, game):
+    points = {"1-0": (0, 2), "0-1": (2, 0), "1/2-1/2": (1, 1)}[game["result"]] #index into wins/draws/losses
+    whiteMove = game["firstMove"][1]
+    for notation, seconds, nodes in game["moves"]:
+        if seconds is not None:
+            record = stats[game["white"] if whiteMove else game["black"]]
+            record[3] += seconds
+            record[4] += nodes
+            record[5] += 1
+        whiteMove = not whiteMove
+    stats[game["white"]][points[0]] += 1
+    if game["black"] != game["white"]:
+        stats[game["black"]][points[1]] += 1
+
+'''
+Print the score table: wins/draws/losses, points, and the average time and nodes per second of each player
+'''
+def printStats(stats, out = sys.stdout):
+    out.write("%-36s %5s %5s %5s %7s %10s %10s\n" % ("player", "win", "draw", "loss", "score", "s/move", "nps"))
+    for spec, (wins, draws, losses, seconds, nodes, moves) in stats.items():
+        played = wins + draws + losses
+        out.write("%-36s %5d %5d %5d %6.1f%% %10.3f %10.0f\n" %
+                  (spec, wins, draws, losses, 100.0 * (wins + draws / 2) / played if played else 0,
+                   seconds / moves if moves else 0, nodes / seconds if seconds > 0 else 0))
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Engine vs engine games for ChessEngine")
+    parser.add_argument("players", nargs = 2, metavar = "PLAYER",
+                        help = "random, greedy or alphabeta[:depth=D][,time=S][,nodes=N][,hash=MB][,nullmove=0|1][,lmr=0|1]")
+    parser.add_argument("--games", type = int, default = 10, help = "number of games (default 10)")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(),
+                        help = "games played at the same time (default: number of CPUs)")
+    parser.add_argument("--openings", help = "file of opening lines to start games from")
+    parser.add_argument("--max-plies", type = int, default = 200, help = "games this long are scored as draws")
+    parser.add_argument("--backend", choices = ("mailbox", "bitboard"), default = "mailbox")
+    parser.add_argument("--pgn", default = "tournament.pgn", help = "file the games are appended to")
+    parser.add_argument("--seed", type = int, default = 0, help = "random seed of the first game")
+    args = parser.parse_args(argv)
+
+    try:
+        openings = readOpenings(args.openings) if args.openings else None
+        stats = runTournament(args.players[0], args.players[1], args.games, args.workers, openings,
+                              args.max_plies, args.backend, args.pgn, args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+    printStats(stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
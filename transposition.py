@@ -0,0 +1,81 @@
+'''
+Fixed size transposition table: remembers the score, depth and best move of positions the search
+has already looked at, keyed by GameState.zobristKey
+'''
+from array import array
+
+#kinds of stored scores
+EXACT = 0 #score is the true value of the position
+LOWERBOUND = 1 #search failed high (score >= beta), true value is at least this
+UPPERBOUND = 2 #search failed low (score <= alpha), true value is at most this
+
+#each entry is a 64 bit key, a 64 bit float score and one 32 bit word packed as
+#move id (16 bits) | bound (2 bits) | depth (6 bits) | search generation (8 bits)
+ENTRY_BYTES = 8 + 8 + 4
+BUCKET_SIZE = 2 #slot 0 keeps the deepest result, slot 1 always takes the newest
+
+class TranspositionTable():
+    def __init__(self, sizeMB = 16):
+        self.resize(sizeMB)
+
+    '''
+    Allocate the largest power of two number of buckets that fits in sizeMB megabytes (clears the table)
+    '''
+    def resize(self, sizeMB):
+        buckets = 1
+        while buckets * 2 * BUCKET_SIZE * ENTRY_BYTES <= sizeMB * 1024 * 1024:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.entries = buckets * BUCKET_SIZE
+        #flat arrays of numbers instead of a dict of objects, so millions of entries cost no GC work
+        self.keys = array('Q', bytes(8 * self.entries))
+        self.scores = array('d', bytes(8 * self.entries))
+        self.data = array('I', bytes(4 * self.entries))
+        self.generation = 1 #never 0, so a stored entry is never mistaken for an empty slot
+
+    def clear(self):
+        self.resize(self.sizeMB())
+
+    '''
+    Memory used by the table in megabytes
+    '''
+    def sizeMB(self):
+        return self.entries * ENTRY_BYTES / (1024 * 1024)
+
+    '''
+    Called at the start of every search so entries from older searches are replaced first
+    '''
+    def newSearch(self):
+        self.generation = self.generation % 0xFF + 1 #counts 1 to 255 and wraps around
+
+    '''
+    Returns (score, depth, bound, moveID) stored for key, or None if the position isn't in the table
+    '''
+    def probe(self, key):
+        slot = (key & self.mask) * BUCKET_SIZE
+        keys = self.keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                return None
+        data = self.data[slot]
+        if data == 0: #empty slot with a key of 0
+            return None
+        return self.scores[slot], (data >> 18) & 0x3F, (data >> 16) & 0x3, data & 0xFFFF
+
+    '''
+    Store a search result; moveID is Move.moveID of the best move found (0 if there is none)
+    '''
+    def store(self, key, score, depth, bound, moveID):
+        slot = (key & self.mask) * BUCKET_SIZE
+        old = self.data[slot]
+        #depth preferred slot: take it if it holds this position, a shallower result or one from an older search
+        if not (self.keys[slot] == key or old == 0 or depth >= (old >> 18) & 0x3F or (old >> 24) != self.generation):
+            slot += 1 #always replace slot
+            if self.keys[slot] == key and moveID == 0:
+                moveID = self.data[slot] & 0xFFFF #keep the best move we already knew for this position
+        elif self.keys[slot] == key and moveID == 0:
+            moveID = old & 0xFFFF
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.data[slot] = moveID | (bound << 16) | (min(depth, 0x3F) << 18) | (self.generation << 24)
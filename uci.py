@@ -0,0 +1,241 @@
+'''
+UCI front end: lets tournament managers and other UCI tools talk to the engine over stdin/stdout.
+The main thread reads commands while searches run in a background thread, so "stop" is handled at once
+
+usage: python uci.py
+'''
+
+import sys
+import threading
+import time
+import ChessEngine
+import chessAI
+import transposition
+import moveOrdering
+
+ENGINE_NAME = "ChessEngine"
+ENGINE_AUTHOR = "ChessEngine authors"
+DEFAULT_BACKEND = "bitboard" #the faster move generator
+MOVES_TO_GO = 30 #moves the remaining clock time is shared over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 #seconds kept back per move for communication delays
+MIN_HASH_MB, MAX_HASH_MB = 1, 1024
+
+
+class UCIEngine():
+    def __init__(self, out = sys.stdout):
+        self.out = out
+        self.outputLock = threading.Lock() #the search thread and the main thread both write
+        self.backend = DEFAULT_BACKEND
+        self.searcher = chessAI.Searcher(transpositionTable = transposition.TranspositionTable(chessAI.TT_SIZE_MB),
+                                         ordering = moveOrdering.MoveOrdering())
+        self.searcher.onIteration = self.sendInfo
+        self.searchThread = None
+        self.infinite = False #"go infinite" and "go ponder" wait for stop before sending bestmove
+        self.ponderOptions = None #go options of the running ponder search, its clock times count from ponderhit
+        self.ownBook = True #play from chessAI's opening book while the position is in it
+        self.stopEvent = threading.Event()
+        self.gs = ChessEngine.GameState(self.backend)
+
+    '''
+    Write one line to the GUI
+    '''
+    def send(self, line):
+        with self.outputLock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    '''
+    Read commands from input until "quit" or the end of input
+    '''
+    def loop(self, lines = sys.stdin):
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stopSearch()
+
+    '''
+    Handle one command line, returns False on quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min %d max %d" % (chessAI.TT_SIZE_MB, MIN_HASH_MB, MAX_HASH_MB))
+            self.send("option name Backend type combo default " + DEFAULT_BACKEND + " var mailbox var bitboard")
+            self.send("option name OwnBook type check default true")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.setOption(args)
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.searcher.transpositionTable.clear()
+            self.searcher.ordering.clear()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            self.stopSearch()
+            self.go(args)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "quit":
+            return False
+        else:
+            self.send("info string unknown command " + command)
+        return True
+
+    '''
+    setoption name <name> value <value>
+    '''
+    def setOption(self, args):
+        if "name" not in args:
+            return
+        valueAt = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:valueAt]).lower()
+        value = " ".join(args[valueAt + 1:])
+        self.stopSearch()
+        if name == "hash" and value.isdigit():
+            self.searcher.transpositionTable.resize(min(max(int(value), MIN_HASH_MB), MAX_HASH_MB))
+        elif name == "backend" and value in ("mailbox", "bitboard"):
+            self.backend = value
+            self.gs = ChessEngine.GameState.fromFEN(self.gs.toFEN(), value) #the game history isn't needed
+        elif name == "ownbook" and value in ("true", "false"):
+            self.ownBook = value == "true"
+        else:
+            self.send("info string unknown option " + " ".join(args))
+
+    '''
+    position [startpos | fen <FEN>] [moves <move> ...], moves in coordinate notation (e2e4, e7e8q)
+    '''
+    def setPosition(self, args):
+        movesAt = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args and args[0] == "fen":
+                gs = ChessEngine.GameState.fromFEN(" ".join(args[1:movesAt]), self.backend)
+            else:
+                gs = ChessEngine.GameState(self.backend)
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        for notation in args[movesAt + 1:]:
+            move = next((move for move in gs.validMoves() if move.getChessNotation() == notation), None)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                break
+            gs.makeMove(move)
+        self.gs = gs
+
+    '''
+    go [depth N] [nodes N] [movetime MS] [wtime MS] [btime MS] [winc MS] [binc MS] [movestogo N] [infinite] [ponder]
+    Starts the search in a background thread
+    '''
+    def go(self, args):
+        options = {}
+        i = 0
+        while i < len(args):
+            if args[i] in ("infinite", "ponder"):
+                options[args[i]] = True
+                i += 1
+            elif i + 1 < len(args) and args[i + 1].lstrip("-").isdigit():
+                options[args[i]] = int(args[i + 1])
+                i += 2
+            else:
+                i += 1 #unsupported option (searchmoves, mate), ignore
+        searcher = self.searcher
+        searcher.depth = options.get("depth", chessAI.MAX_DEPTH)
+        searcher.maxNodes = options.get("nodes")
+        searcher.timeLimit = self.timeForMove(options)
+        searcher.stopped = False
+        self.infinite = "infinite" in options or "ponder" in options
+        self.ponderOptions = options if "ponder" in options else None
+        self.stopEvent.clear()
+        self.searchThread = threading.Thread(target = self.search, args = (self.gs,), daemon = True)
+        self.searchThread.start()
+
+    '''
+    The move pondered on was played: the running search becomes a normal one, with the time the go options give
+    counted from now, and sends its bestmove when that runs out
+    '''
+    def ponderHit(self):
+        options = self.ponderOptions
+        self.ponderOptions = None
+        if options is not None:
+            options = {name: value for name, value in options.items() if name != "ponder"}
+            timeLimit = self.timeForMove(options)
+            if timeLimit is not None:
+                searcher = self.searcher
+                searcher.timeLimit = timeLimit #in case the search thread hasn't started its search yet
+                searcher.deadline = time.perf_counter() + timeLimit
+        self.infinite = False #play the move the search ends with
+        self.stopEvent.set()
+
+    '''
+    Seconds to think: movetime if given, else a share of the side to move's clock (None for no limit)
+    '''
+    def timeForMove(self, options):
+        if "infinite" in options or "ponder" in options:
+            return None
+        if "movetime" in options:
+            return max(options["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+        clock, increment = ("wtime", "winc") if self.gs.whiteMove else ("btime", "binc")
+        if clock not in options:
+            return None
+        remaining = options[clock] / 1000
+        share = remaining / options.get("movestogo", MOVES_TO_GO) + options.get(increment, 0) / 1000 * 0.8
+        return max(min(share, remaining / 2) - MOVE_OVERHEAD, 0.01)
+
+    '''
+    Body of the search thread: search, then report the best move
+    '''
+    def search(self, gs):
+        move = chessAI.bookMove(gs, gs.validMoves()) if self.ownBook and not self.infinite else None
+        if move is not None:
+            self.send("bestmove " + move.getChessNotation())
+            return
+        result = self.searcher.search(gs)
+        if self.infinite: #the GUI decides when the search is over
+            self.stopEvent.wait()
+        move = result.move
+        self.send("bestmove " + (move.getChessNotation() if move is not None else "0000"))
+
+    '''
+    Stop the running search, if any, and wait for it to send its bestmove
+    '''
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.searcher.stop()
+            self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    '''
+    Called by the search after every finished depth
+    '''
+    def sendInfo(self, result):
+        plies = chessAI.matePlies(result.score)
+        if plies is not None: #mate or tablebase win, UCI counts it in moves
+            moves = (plies + 1) // 2
+            score = "mate " + str(moves if result.score > 0 else -moves)
+        else:
+            score = "cp " + str(int(round(result.score * 100))) #scores are in pawns
+        milliseconds = int(result.elapsed * 1000)
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" %
+                  (result.depth, score, result.nodes, result.nodes / result.elapsed if result.elapsed > 0 else 0,
+                   milliseconds, " ".join(move.getChessNotation() for move in result.pv)))
+
+
+def main():
+    UCIEngine().loop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())